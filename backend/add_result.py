@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 """
-Script to manually add processed results to backend job tracking
+Script to manually add processed results to the backend results store
 """
-import json
 from pathlib import Path
 from datetime import datetime
 import sys
@@ -11,7 +10,26 @@ import os
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from server import results
+import orjson
+
+from store import ResultsStore
+
+try:
+    import numpy as np
+except ImportError:  # numpy comes with pandas, but keep the script usable without it
+    np = None
+
+def summarize_investments(investments):
+    """Return (total_cost, total_fair_value), treating missing values as 0"""
+    if np is None:
+        return (
+            sum(inv.get("investment_cost", 0) or 0 for inv in investments),
+            sum(inv.get("fair_value", 0) or 0 for inv in investments),
+        )
+    n = len(investments)
+    costs = np.fromiter((inv.get("investment_cost") or np.nan for inv in investments), dtype=np.float64, count=n)
+    fair_values = np.fromiter((inv.get("fair_value") or np.nan for inv in investments), dtype=np.float64, count=n)
+    return float(np.nansum(costs)), float(np.nansum(fair_values))
 
 def add_result_to_history():
     """Add the processed Peak Credit Fund result to backend history"""
@@ -27,8 +45,7 @@ def add_result_to_history():
         print(f"Error: {normalized_path} not found")
         return
     
-    with open(normalized_path, 'r') as f:
-        normalized_data = json.load(f)
+    normalized_data = orjson.loads(normalized_path.read_bytes())
     
     # Create downloads URLs
     downloads = {
@@ -39,6 +56,7 @@ def add_result_to_history():
     
     # Create preview data
     investments = normalized_data.get("investments", [])
+    total_cost, total_fair_value = summarize_investments(investments)
     preview = {
         "fund": {
             "name": normalized_data.get("fund", {}).get("fund_name", "Unknown"),
@@ -58,13 +76,14 @@ def add_result_to_history():
         ],
         "summary": {
             "total_investments": len(investments),
-            "total_cost": sum(inv.get("investment_cost", 0) or 0 for inv in investments),
-            "total_fair_value": sum(inv.get("fair_value", 0) or 0 for inv in investments),
+            "total_cost": total_cost,
+            "total_fair_value": total_fair_value,
         }
     }
     
-    # Add to results
-    results[file_hash] = {
+    # Add to the shared results store (picked up by the running server)
+    results = ResultsStore()
+    results.put(file_hash, {
         "hash": file_hash,
         "filename": filename,
         "doc_type": "fund_financials",
@@ -73,7 +92,7 @@ def add_result_to_history():
         "preview": preview,
         "completedAt": datetime.now().isoformat(),
         "run_dir": str(Path(run_dir).absolute()),
-    }
+    })
     
     print(f"✅ Added result for {filename}")
     print(f"📊 {len(investments)} investments processed")
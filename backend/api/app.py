@@ -3,19 +3,9 @@
 Vision-based extraction pipeline: Gemini Vision + LangExtract
 """
 import argparse
-from pathlib import Path
-from pipeline import (
-    setup_gemini,
-    extract_pdf_pages_as_images,
-    vision_to_markdown,
-    load_prompt,
-    load_examples,
-    run_langextract,
-    ensure_run_dir,
-    save_outputs,
-    normalize_to_schema,
-)
-import os
+from pipeline import ensure_run_dir
+from runner import run_document
+from cache import ExtractionCache, SemanticCache, DEFAULT_CACHE_DIR
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -25,6 +15,13 @@ def main():
     ap.add_argument("--pdf", required=True, help="Path to a PDF file")
     ap.add_argument("--page-ranges", nargs='+', default=["0:0", "6:7"], 
                    help="Page ranges in format 'start:end' (0-indexed). Default: '0:0 6:7' (first page + investment pages)")
+    ap.add_argument("--dpi", type=int, default=150, help="Render resolution for PDF pages sent to Gemini Vision (default: 150)")
+    ap.add_argument("--no-cache", action="store_true", help="Always call the LLMs, ignoring cached extractions")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Extraction cache directory (default: {DEFAULT_CACHE_DIR})")
+    ap.add_argument("--semantic-cache", action="store_true",
+                   help="Reuse a prior extraction when the document is a near-duplicate of one already processed")
+    ap.add_argument("--semantic-threshold", type=float, default=0.92,
+                   help="Cosine similarity needed for a semantic cache hit (default: 0.92)")
     args = ap.parse_args()
 
     # Parse page ranges
@@ -38,64 +35,35 @@ def main():
             return
 
     run_dir = ensure_run_dir()
+    cache = None if args.no_cache else ExtractionCache(args.cache_dir)
+    semantic_cache = SemanticCache(threshold=args.semantic_threshold) if args.semantic_cache else None
 
-    # 1) PDF Pages -> Images -> Markdown via Gemini Vision
-    print("Step 1: Converting PDF pages to markdown using Gemini Vision...")
-    print(f"Extracting pages: {page_ranges}")
-    model = setup_gemini()
-    images = extract_pdf_pages_as_images(args.pdf, page_ranges)
-    markdown_content = vision_to_markdown(model, images)
-    
-    if not markdown_content:
-        print("Failed to convert PDF pages to markdown")
+    try:
+        run_document(
+            args.pdf,
+            run_dir,
+            page_ranges=page_ranges,
+            dpi=args.dpi,
+            cache=cache,
+            semantic_cache=semantic_cache,
+        )
+    except RuntimeError as e:
+        print(e)
         return
-    
-    # Save the vision-generated markdown
-    (run_dir / "vision_markdown.md").write_text(markdown_content, encoding="utf-8")
-    print(f"Vision markdown saved: {run_dir/'vision_markdown.md'}")
-    print(f"Length: {len(markdown_content)} characters")
-
-    # 2) Load prompt & examples
-    print("Step 2: Loading prompt and examples...")
-    prompt = load_prompt("prompts/fund_terms.md")
-    examples = load_examples("prompts/examples.jsonl")
-
-    # 3) LangExtract on vision-generated markdown
-    print("Step 3: Running LangExtract on vision-generated markdown...")
-    if not os.getenv("LANGEXTRACT_API_KEY") and os.getenv("GOOGLE_API_KEY"):
-        os.environ["LANGEXTRACT_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-    
-    result = run_langextract(markdown_content, prompt, examples)
-
-    # 4) Save artifacts (JSONL + HTML viz)
-    print("Step 4: Saving extraction artifacts...")
-    save_outputs(result, run_dir)
-
-    # 5) Normalize to schema
-    print("Step 5: Normalizing to schema...")
-    model = normalize_to_schema(result, run_dir)
-
-    # 6) Export to CSV and PDF
-    print("Step 6: Exporting to CSV and PDF...")
-    from exporter import to_relational_rows, write_csvs, write_pdf_report
-    
-    fund_id = run_dir.name  # simple, unique per run; good as our PK
-
-    # Write CSVs
-    tables = to_relational_rows(model, fund_id=fund_id)
-    csv_dir = run_dir / "csv"
-    write_csvs(tables, csv_dir)
-
-    # PDF report
-    write_pdf_report(model, run_dir / "report.pdf", fund_id=fund_id)
 
     print("Done!")
-    print(f"- Vision markdown: {run_dir/'vision_markdown.md'}")
-    print(f"- JSON: {run_dir/'normalized.json'}")
-    print(f"- QA HTML: {run_dir/'review.html'}")
-    print(f"- Raw extractions: {run_dir/'extraction.jsonl'}")
-    print(f"- CSV folder: {csv_dir}")
-    print(f"- PDF report: {run_dir/'report.pdf'}")
+    # A cache hit skips Vision and/or LangExtract, so list only what this run wrote
+    artifacts = [
+        ("Vision markdown", "vision_markdown.md"),
+        ("JSON", "normalized.json"),
+        ("QA HTML", "review.html"),
+        ("Raw extractions", "extraction.jsonl"),
+        ("CSV folder", "csv"),
+        ("PDF report", "report.pdf"),
+    ]
+    for label, name in artifacts:
+        if (run_dir / name).exists():
+            print(f"- {label}: {run_dir/name}")
 
 if __name__ == "__main__":
     main()
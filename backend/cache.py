@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Content-addressable on-disk cache for extraction results
+Keyed by the PDF bytes plus everything that influences the extraction
+(model, prompt, examples), so a hit means the LLM calls can be skipped
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import orjson
+
+DEFAULT_CACHE_DIR = ".cache/extractions"
+DEFAULT_SEMANTIC_CACHE_DIR = ".cache/semantic"
+DEFAULT_VISION_CACHE_DIR = ".cache/vision"
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, streamed so large PDFs are never held in memory"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def _hash_parts(parts: Iterable[bytes]) -> str:
+    """SHA-256 over length-prefixed parts, so different splits of the same bytes never collide"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+def extraction_key(pdf_digest: str, prompt: str, examples_bytes: bytes, model_id: str, extra: str = "") -> str:
+    """Compute the cache key for one extraction run from the PDF's file_sha256 digest"""
+    return _hash_parts((model_id.encode(), prompt.encode(), examples_bytes, extra.encode(), pdf_digest.encode()))
+
+def markdown_key(markdown: str, prompt: str, examples_bytes: bytes, model_id: str) -> str:
+    """
+    Compute the cache key for LangExtract over one Vision markdown.
+    Surrounding whitespace and blank lines are ignored; line breaks (table rows) are kept.
+    """
+    canonical = "\n".join(line.strip() for line in markdown.splitlines() if line.strip())
+    return _hash_parts((b"markdown", model_id.encode(), prompt.encode(), examples_bytes, canonical.encode()))
+
+def vision_key(model_id: str, prompt: str, images: Iterable[bytes]) -> str:
+    """Compute the cache key for one Gemini Vision call (prompt + rendered page images)"""
+    return _hash_parts((model_id.encode(), prompt.encode(), *images))
+
+class ExtractionCache:
+    """
+    JSON-on-disk cache: one <key>.json file per extraction.
+    With max_entries set, a hit refreshes the entry's mtime and a put evicts
+    the least recently used entries beyond max_entries.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: Optional[int] = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            payload = orjson.loads(path.read_bytes())
+        except (OSError, ValueError):
+            # Unreadable/corrupt entry - treat as a miss
+            self.evict(key)
+            return None
+        if self.max_entries:
+            try:
+                os.utime(path)  # mark as recently used
+            except OSError:
+                pass
+        return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file then rename so readers never see a partial entry;
+        # the temp name is unique so concurrent puts of one key don't collide
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+            tmp.write(orjson.dumps(payload))
+        try:
+            os.replace(tmp.name, self._path(key))
+        except OSError:
+            Path(tmp.name).unlink(missing_ok=True)
+            raise
+        if self.max_entries:
+            self._trim()
+
+    def _trim(self) -> None:
+        """Drop the least recently used entries beyond max_entries"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass  # removed concurrently
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            Path(path).unlink(missing_ok=True)
+
+    def evict(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+class SemanticCache:
+    """
+    Near-duplicate cache: maps document embeddings to prior extractions.
+    Lookups are a brute-force cosine search (exact, like a flat inner-product
+    index), which is plenty for the number of documents a workstation sees.
+    The normalized index matrix is kept in memory and reloaded only when
+    index.jsonl changes (here or in another process).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_SEMANTIC_CACHE_DIR, threshold: float = 0.92):
+        self.cache_dir = Path(cache_dir)
+        self.index_path = self.cache_dir / "index.jsonl"
+        self.threshold = threshold
+        self._index = ([], None)
+        self._index_stamp = None  # (mtime_ns, size) of index.jsonl when _index was loaded
+
+    def _load_index(self):
+        try:
+            st = self.index_path.stat()
+        except FileNotFoundError:
+            return [], None
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._index_stamp:
+            return self._index
+        import numpy as np
+
+        keys, vectors = [], []
+        with open(self.index_path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = orjson.loads(line)
+                keys.append(row["key"])
+                vectors.append(row["embedding"])
+        matrix = None
+        if keys:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        self._index, self._index_stamp = (keys, matrix), stamp
+        return self._index
+
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[str, dict]]:
+        """Return (key, cached payload) of the most similar document above the threshold"""
+        keys, matrix = self._load_index()
+        if not keys:
+            return None
+        import numpy as np
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        scores = matrix @ query
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        print(f"Semantic cache hit (similarity {scores[best]:.3f})")
+        try:
+            return keys[best], orjson.loads((self.cache_dir / f"{keys[best]}.json").read_bytes())
+        except (OSError, ValueError):
+            self.evict(keys[best])  # payload missing/corrupt - drop the dangling index row
+            return None
+
+    def add(self, embedding: List[float], payload: dict) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        key = hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        (self.cache_dir / f"{key}.json").write_bytes(orjson.dumps(payload))
+        row = {"key": key, "embedding": list(embedding)}
+        with open(self.index_path, "ab") as f:
+            f.write(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE))
+        self._index_stamp = None
+
+    def evict(self, key: str) -> None:
+        """Drop an entry (e.g. a payload that no longer matches the schema) from the index"""
+        if self.index_path.exists():
+            lines = [line for line in self.index_path.read_bytes().splitlines(keepends=True)
+                     if line.strip() and orjson.loads(line)["key"] != key]
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+                tmp.writelines(lines)
+            os.replace(tmp.name, self.index_path)
+        (self.cache_dir / f"{key}.json").unlink(missing_ok=True)
+        self._index_stamp = None
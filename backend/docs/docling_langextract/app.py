@@ -2,32 +2,32 @@ import argparse
 from pathlib import Path
 from pipeline import (
     pdf_to_markdown,
-    add_simple_page_anchors,
+    pdf_to_markdown_parallel,
+    pdfs_to_markdown_parallel,
+    cached_pdf_to_markdown,
+    cached_pdfs_to_markdown,
     normalize_text,
     load_prompt,
     load_examples,
     run_langextract,
+    run_langextract_batch,
     ensure_run_dir,
     save_outputs,
     normalize_to_schema,
 )
-from exporter import to_relational_rows, write_csvs, write_pdf_report
 import os
 from dotenv import load_dotenv
 
 load_dotenv()  # make sure .env is loaded
 
 
-def main():
-    ap = argparse.ArgumentParser(description="PDF -> LangExtract MVP")
-    ap.add_argument("--pdf", required=True, help="Path to a PDF file")
-    args = ap.parse_args()
-
-    run_dir = ensure_run_dir()
-
+def process_one(pdf_path: str, run_dir: Path, fund_id: str, parallel: bool = False, no_cache: bool = False):
+    """Run the whole pipeline for one PDF, writing its artifacts into run_dir"""
     # 1) PDF -> Markdown
-    md = pdf_to_markdown(args.pdf)
-    md = add_simple_page_anchors(md)
+    if no_cache:
+        md = pdf_to_markdown_parallel(pdf_path) if parallel else pdf_to_markdown(pdf_path)
+    else:
+        md = cached_pdf_to_markdown(pdf_path, parallel=parallel)
     clean_text = normalize_text(md)
 
     # 2) Load prompt & examples
@@ -35,24 +35,28 @@ def main():
     examples = load_examples("prompts/examples.jsonl")
 
     # 3) LangExtract
-    if not os.getenv("LANGEXTRACT_API_KEY") and os.getenv("GOOGLE_API_KEY"):
-        os.environ["LANGEXTRACT_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-    
     result = run_langextract(clean_text, prompt, examples)
 
+    write_outputs(pdf_path, result, run_dir, fund_id)
+
+
+def write_outputs(pdf_path: str, result, run_dir: Path, fund_id: str):
+    """Save, normalize and export one document's LangExtract result into run_dir"""
+    run_dir.mkdir(parents=True, exist_ok=True)
+
     # 4) Save artifacts (JSONL + HTML viz)
     save_outputs(result, run_dir)
 
     # 5) Normalize to your schema
     model = normalize_to_schema(result, run_dir)
 
-    print("Done!")
+    print(f"Done: {pdf_path}")
     print(f"- JSON: {run_dir/'normalized.json'}")
     print(f"- QA HTML: {run_dir/'review.html'}")
     print(f"- Raw extractions: {run_dir/'extraction.jsonl'}")
 
-    # 6) Export to CSV and PDF
-    fund_id = run_dir.name  # simple, unique per run; good as our PK
+    # 6) Export to CSV and PDF - pandas/reportlab are only imported when exporting
+    from exporter import to_relational_rows, write_csvs, write_pdf_report
 
     # Write CSVs
     tables = to_relational_rows(model, fund_id=fund_id)
@@ -65,5 +69,64 @@ def main():
     print(f"- CSV folder: {csv_dir}")
     print(f"- PDF report: {run_dir/'report.pdf'}")
 
+
+def main():
+    ap = argparse.ArgumentParser(description="PDF -> LangExtract MVP")
+    ap.add_argument("--pdf", required=True, nargs="+", help="Path to one or more PDF files")
+    ap.add_argument("--parallel", action="store_true", help="Convert page chunks in parallel processes (long PDFs)")
+    ap.add_argument("--no-cache", action="store_true", help="Always re-run Docling, ignoring cached markdown")
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                    help="PDFs converted at once when several are given; each worker "
+                         "loads its own Docling models (default: min(4, CPU count))")
+    args = ap.parse_args()
+
+    if not os.getenv("LANGEXTRACT_API_KEY") and os.getenv("GOOGLE_API_KEY"):
+        os.environ["LANGEXTRACT_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+
+    run_dir = ensure_run_dir()
+    if len(args.pdf) == 1:
+        fund_id = run_dir.name  # simple, unique per run; good as our PK
+        process_one(args.pdf[0], run_dir, fund_id, parallel=args.parallel, no_cache=args.no_cache)
+        return
+
+    # Several PDFs: one sub-directory per document under this run. Docling
+    # converts them in a process pool, one document per worker (page splitting
+    # stays off to avoid nested pools)
+    if args.parallel:
+        print("Note: --parallel is ignored when several PDFs are processed at once")
+    if args.no_cache:
+        mds = pdfs_to_markdown_parallel(args.pdf, workers=args.workers)
+    else:
+        mds = cached_pdfs_to_markdown(args.pdf, workers=args.workers)
+
+    prompt = load_prompt("prompts/fund_terms.md")
+    examples = load_examples("prompts/examples.jsonl")
+
+    # PDFs Docling couldn't convert are reported and skipped
+    docs = [(i, pdf_path, normalize_text(md))
+            for i, (pdf_path, md) in enumerate(zip(args.pdf, mds), start=1) if md is not None]
+    failed = len(args.pdf) - len(docs)
+
+    # LangExtract over all documents at once, so their chunks share one worker pool.
+    # If the batch fails, extract one document at a time so a bad document only
+    # fails itself
+    try:
+        results = run_langextract_batch([text for _, _, text in docs], prompt, examples)
+    except Exception as e:
+        print(f"Batched LangExtract failed ({e}), extracting documents one at a time")
+        results = [None] * len(docs)
+
+    for (i, pdf_path, text), result in zip(docs, results):
+        doc_dir = run_dir / f"{i:02d}_{Path(pdf_path).stem}"
+        fund_id = f"{run_dir.name}_{i:02d}"
+        try:
+            if result is None:
+                result = run_langextract(text, prompt, examples)
+            write_outputs(pdf_path, result, doc_dir, fund_id)
+        except Exception as e:
+            failed += 1
+            print(f"Failed: {pdf_path}: {e}")
+    print(f"Processed {len(args.pdf) - failed}/{len(args.pdf)} PDFs into {run_dir}")
+
 if __name__ == "__main__":
     main()
@@ -3,19 +3,21 @@
 Check Docling markdown output to see table structure
 """
 import argparse
+import re
 from pathlib import Path
-from pipeline import pdf_to_markdown
+from pipeline import pdf_to_markdown, pdf_to_markdown_parallel
 
 def main():
     ap = argparse.ArgumentParser(description="Generate Docling markdown output for inspection")
     ap.add_argument("--pdf", required=True, help="Path to PDF file")
     ap.add_argument("--output", default="docling_improved.md", help="Output markdown file")
+    ap.add_argument("--parallel", action="store_true", help="Convert page chunks in parallel processes (long PDFs)")
     args = ap.parse_args()
 
     print(f"Converting PDF with Docling: {args.pdf}")
     
     # Generate markdown using Docling
-    md = pdf_to_markdown(args.pdf)
+    md = pdf_to_markdown_parallel(args.pdf) if args.parallel else pdf_to_markdown(args.pdf)
     
     # Save to file
     output_path = Path(args.output)
@@ -37,11 +39,28 @@ def main():
     ]
     
     print("\nSearching for investment content:")
-    for keyword in investment_keywords:
-        if keyword.lower() in md.lower():
+    # Lowercase once and find every keyword in a single left-to-right scan.
+    # The lookahead makes matches zero-width, so overlapping keywords
+    # (e.g. "investments" inside "schedule of investments") are all seen.
+    md_low = md.lower()
+    keywords = [keyword.lower() for keyword in investment_keywords]
+    pattern = re.compile(
+        "(?=(" + "|".join(re.escape(k) for k in sorted(set(keywords), key=len, reverse=True)) + "))"
+    )
+    first_idx = {}
+    for match in pattern.finditer(md_low):
+        pos = match.start()
+        for k in keywords:
+            if k not in first_idx and md_low.startswith(k, pos):
+                first_idx[k] = pos
+        if len(first_idx) == len(keywords):
+            break
+
+    for keyword, k in zip(investment_keywords, keywords):
+        if k in first_idx:
             print(f"✓ Found '{keyword}' in the markdown")
             # Find the context around this keyword
-            idx = md.lower().find(keyword.lower())
+            idx = first_idx[k]
             start = max(0, idx - 100)
             end = min(len(md), idx + len(keyword) + 100)
             context = md[start:end]
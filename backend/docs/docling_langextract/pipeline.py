@@ -1,68 +1,249 @@
 from pathlib import Path
-import re, json, datetime, os
-import os
+import re, datetime, os, hashlib, tempfile
+from bisect import bisect_right
+from itertools import accumulate
+from types import MappingProxyType
+import orjson
+import functools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# Load .env before any of the settings below are read from the environment
+load_dotenv()
 
 
 # 1) PDF -> Markdown via Docling
-from docling.document_converter import DocumentConverter  # Docling usage. :contentReference[oaicite:1]{index=1}
+DOCLING_DO_OCR = False  # set to True if your PDF is scanned
+# Page bitmap scale. Pixels grow with its square, and only OCR needs the
+# high-res render - layout and TableFormer work from their own page images
+DOCLING_IMAGES_SCALE = float(os.getenv("DOCLING_IMAGES_SCALE", "3.0" if DOCLING_DO_OCR else "1.5"))
+# CPU threads for the layout/table models (device is picked automatically: CUDA/MPS/CPU).
+# Docling's own default; process pools below split the CPUs between their workers instead
+DOCLING_NUM_THREADS = int(os.getenv("DOCLING_NUM_THREADS", "4"))
 
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions, TesseractCliOcrOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
+@functools.lru_cache(maxsize=1)
+def _get_converter():
+    """
+    Build the Docling converter once per process; its layout/table models are
+    loaded lazily on first use and then reused by every later conversion.
+    Docling itself is imported here so helpers like normalize_text don't pay for it.
+    """
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import AcceleratorDevice, AcceleratorOptions, PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
 
-def pdf_to_markdown(pdf_path: str) -> str:
     # Configure Docling for better table parsing
     pipe = PdfPipelineOptions(
-        do_ocr=False,                 # set to True if your PDF is scanned
+        do_ocr=DOCLING_DO_OCR,
         do_table_structure=True,      # enable table reconstruction
-        images_scale=3.0,             # higher DPI for better detection
+        images_scale=DOCLING_IMAGES_SCALE,
+        accelerator_options=AcceleratorOptions(
+            num_threads=DOCLING_NUM_THREADS, device=AcceleratorDevice.AUTO
+        ),
     )
     pipe.table_structure_options.do_cell_matching = True
+    # Use pre-fetched models (e.g. `docling-tools models download`) instead of the HF hub
+    artifacts_path = os.getenv("DOCLING_ARTIFACTS_PATH")
+    if artifacts_path:
+        pipe.artifacts_path = artifacts_path
 
-    converter = DocumentConverter(
+    return DocumentConverter(
         format_options={
             InputFormat.PDF: PdfFormatOption(pipeline_options=pipe)
         }
     )
+
+def _init_docling_worker(num_threads: int) -> None:
+    """Pool initializer: runs before the worker builds its converter"""
+    global DOCLING_NUM_THREADS
+    DOCLING_NUM_THREADS = num_threads
+
+def _docling_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for Docling conversions. Each worker's converter gets its share
+    of the CPUs (at most DOCLING_NUM_THREADS), so workers x threads stays near the
+    CPU count rather than every worker running DOCLING_NUM_THREADS threads.
+    """
+    threads = max(1, min(DOCLING_NUM_THREADS, (os.cpu_count() or 1) // workers))
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_docling_worker, initargs=(threads,))
+
+def pdf_to_markdown(pdf_path: str) -> str:
+    converter = _get_converter()
     result = converter.convert(pdf_path)
     md = result.document.export_to_markdown()
     return md
 
-def add_simple_page_anchors(md: str) -> str:
+def pdfs_to_markdown(pdf_paths: list, on_done=None) -> list:
+    """
+    Convert several PDFs in one process with the shared converter, via Docling's
+    convert_all; markdown is returned in input order, None for a PDF that failed
+    to convert. on_done(index, markdown) is called as each conversion succeeds.
+    """
+    from docling.datamodel.base_models import ConversionStatus
+
+    mds = []
+    results = _get_converter().convert_all(pdf_paths, raises_on_error=False)
+    for i, (pdf_path, result) in enumerate(zip(pdf_paths, results)):
+        if result.status in (ConversionStatus.SUCCESS, ConversionStatus.PARTIAL_SUCCESS):
+            mds.append(result.document.export_to_markdown())
+            if on_done:
+                on_done(i, mds[i])
+        else:
+            print(f"Docling failed to convert {pdf_path}: {result.status}")
+            mds.append(None)
+    return mds
+
+def pdfs_to_markdown_parallel(pdf_paths: list, workers: int = None, on_done=None) -> list:
+    """
+    pdfs_to_markdown across a process pool, one document per task. Each worker
+    loads its own copy of the Docling layout/table models, so size workers to
+    memory as much as to cores. A failed PDF is reported and left as None without
+    stopping the others. Same __main__ guard caveat as pdf_to_markdown_parallel.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(pdf_paths))
+    if workers <= 1:
+        return pdfs_to_markdown(pdf_paths, on_done)  # no pool to start or models to load twice
+    mds = [None] * len(pdf_paths)
+    with _docling_pool(workers) as ex:
+        futures = {ex.submit(pdf_to_markdown, pdf_path): i for i, pdf_path in enumerate(pdf_paths)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                mds[i] = future.result()
+            except Exception as e:
+                print(f"Docling failed to convert {pdf_paths[i]}: {e}")
+                continue
+            if on_done:
+                on_done(i, mds[i])
+    return mds
+
+def _docling_chunk(args) -> str:
+    """Worker: convert one 1-based inclusive page range (runs in a child process)"""
+    pdf_path, page_range = args
+    result = _get_converter().convert(pdf_path, page_range=page_range)
+    return result.document.export_to_markdown()
+
+def pdf_to_markdown_parallel(pdf_path: str, chunk_size: int = 16, workers: int = None) -> str:
     """
-    Super-simple anchor insertion. If your MD includes explicit page markers,
-    keep them; otherwise, this is a harmless no-op.
+    Convert long PDFs by splitting them into page-range chunks and running
+    Docling in a process pool (pdfium is not thread-safe, but is safe across
+    processes). Markdown is concatenated in page order. Callers must run under
+    an `if __name__ == "__main__"` guard so spawned workers don't re-run main.
     """
-    # For many PDFs Docling already preserves structure; we’ll just return md.
+    import pypdfium2 as pdfium  # installed with docling
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    n_pages = len(pdf)
+    pdf.close()
+    if n_pages <= chunk_size:
+        return pdf_to_markdown(pdf_path)
+
+    ranges = [(start, min(start + chunk_size - 1, n_pages)) for start in range(1, n_pages + 1, chunk_size)]
+    with _docling_pool(min(workers or os.cpu_count() or 1, len(ranges))) as ex:
+        mds = list(ex.map(_docling_chunk, [(pdf_path, r) for r in ranges]))
+    return "\n\n".join(mds)
+
+# Converted markdown is cached on disk keyed by the PDF's hash plus this tag;
+# change the tag whenever _get_converter's pipeline options change
+DOCLING_CACHE_DIR = os.getenv("DOCLING_CACHE_DIR", ".cache/docling")
+_CONVERTER_TAG = f"scale{DOCLING_IMAGES_SCALE}-ocr{int(DOCLING_DO_OCR)}-tables-cellmatch"
+
+def _markdown_cache_path(pdf_path: str) -> Path:
+    with open(pdf_path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256")
+    digest.update(_CONVERTER_TAG.encode())
+    return Path(DOCLING_CACHE_DIR) / f"{digest.hexdigest()}.md"
+
+def _write_markdown_cache(cache_path: Path, md: str) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a uniquely named temp file then rename, so a crash never leaves a
+    # partial entry and two runs converting the same PDF don't collide
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_path.parent, suffix=".tmp", delete=False) as tmp:
+        tmp.write(md)
+    os.replace(tmp.name, cache_path)
+
+def cached_pdf_to_markdown(pdf_path: str, parallel: bool = False) -> str:
+    """pdf_to_markdown (or the parallel variant) backed by the on-disk cache"""
+    cache_path = _markdown_cache_path(pdf_path)
+    if cache_path.exists():
+        print(f"Docling cache hit: {cache_path}")
+        return cache_path.read_text(encoding="utf-8")
+
+    md = pdf_to_markdown_parallel(pdf_path) if parallel else pdf_to_markdown(pdf_path)
+    _write_markdown_cache(cache_path, md)
     return md
 
+def cached_pdfs_to_markdown(pdf_paths: list, workers: int = None) -> list:
+    """
+    pdfs_to_markdown_parallel backed by the on-disk cache; only the misses are
+    converted, and each is cached as soon as it finishes. None for failed PDFs.
+    """
+    cache_paths = [_markdown_cache_path(p) for p in pdf_paths]
+    mds = []
+    for cache_path in cache_paths:
+        if cache_path.exists():
+            print(f"Docling cache hit: {cache_path}")
+            mds.append(cache_path.read_text(encoding="utf-8"))
+        else:
+            mds.append(None)
+    misses = [i for i, md in enumerate(mds) if md is None]
+    if misses:
+        def cache_one(j: int, md: str) -> None:
+            _write_markdown_cache(cache_paths[misses[j]], md)
+
+        converted = pdfs_to_markdown_parallel([pdf_paths[i] for i in misses], workers, on_done=cache_one)
+        for i, md in zip(misses, converted):
+            mds[i] = md
+    return mds
+
+# normalize_text patterns, compiled once at import
+_DEHYPHEN_RE = re.compile(r"(\w)-\n(\w)")
+_TRAILING_WS_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
 def normalize_text(text: str) -> str:
+    # Each pass is skipped when a substring check (much cheaper than a regex
+    # scan) shows it can't match - on typical Docling output most can't
     # de-hyphenate at line ends: "invest-\nment" -> "investment"
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    if "-\n" in text:
+        text = _DEHYPHEN_RE.sub(r"\1\2", text)
     # remove stray spaces before newlines
-    text = re.sub(r"[ \t]+\n", "\n", text)
+    if " \n" in text or "\t\n" in text:
+        text = _TRAILING_WS_RE.sub("\n", text)
     # collapse excessive blank lines
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    if "\n\n\n" in text:
+        text = _BLANK_LINES_RE.sub("\n\n", text)
     return text
 
 # 2) LangExtract extraction
-import langextract as lx  # Library API. :contentReference[oaicite:3]{index=3}
 from schema import FundDocExtraction, FundEntity, FeeTerms, KeyContacts, Investment
-from dotenv import load_dotenv
-load_dotenv()
 
 
-def load_prompt(path: str) -> str:
+@functools.lru_cache(maxsize=8)
+def _load_prompt_cached(path: str, mtime_ns: int) -> str:
     return Path(path).read_text()
 
-def load_examples(path: str):
+def load_prompt(path: str) -> str:
+    # Keyed on mtime so edits to the prompt file are picked up without a restart
+    return _load_prompt_cached(path, os.stat(path).st_mtime_ns)
+
+def _iter_jsonl(path: str):
+    """Yield parsed rows of a JSONL file, reading one line at a time"""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+@functools.lru_cache(maxsize=8)
+def _load_examples_cached(path: str, mtime_ns: int):
     """
     Load examples.jsonl and convert to LangExtract example objects.
     Many community examples use lx.data.ExampleData and lx.data.Extraction. :contentReference[oaicite:4]{index=4}
     """
+    import langextract as lx
+
     examples = []
-    for line in Path(path).read_text().splitlines():
-        row = json.loads(line)
+    for row in _iter_jsonl(path):
         # Build extractions list
         exts = []
         for e in row.get("extractions", []):
@@ -79,24 +260,85 @@ def load_examples(path: str):
                 extractions=exts
             )
         )
-    return examples
+    return tuple(examples)
 
-def run_langextract(clean_text: str, prompt_desc: str, examples):
+def load_examples(path: str):
+    """
+    Parsed examples are cached per (path, mtime) and returned as a shared,
+    immutable tuple - callers must not mutate the example objects.
+    """
+    return _load_examples_cached(path, os.stat(path).st_mtime_ns)
+
+# LangExtract splits the text into chunks of ~LANGEXTRACT_CHAR_BUFFER chars
+# and extracts up to LANGEXTRACT_MAX_WORKERS chunks concurrently
+LANGEXTRACT_MAX_WORKERS = int(os.getenv("LANGEXTRACT_MAX_WORKERS", "16"))
+# 0 = pick the chunk size from the text length (see _char_buffer_for)
+LANGEXTRACT_CHAR_BUFFER = int(os.getenv("LANGEXTRACT_CHAR_BUFFER", "0"))
+# Full extraction passes over the text; each extra pass improves recall on long
+# documents and costs another round of requests
+LANGEXTRACT_EXTRACTION_PASSES = int(os.getenv("LANGEXTRACT_EXTRACTION_PASSES", "3"))
+
+def _char_buffer_for(text_len: int) -> int:
+    """
+    LangExtract chunk size for a text of this length: 1000-char chunks (best
+    recall) for short texts, larger ones for long documents, where requests
+    (chunks x passes) would otherwise dominate the run time.
+    """
+    if text_len < 20_000:
+        return 1000
+    return 2000 if text_len < 100_000 else 4000
+
+def run_langextract(clean_text: str, prompt_desc: str, examples, *,
+                    extraction_passes: int = None, max_workers: int = None, max_char_buffer: int = None):
     """
     Core extraction call. LangExtract supports long docs with multi-pass + parallelism. :contentReference[oaicite:5]{index=5}
+    extraction_passes, max_workers and max_char_buffer default to the LANGEXTRACT_* settings.
     """
+    import langextract as lx
+
+    extraction_passes = extraction_passes or LANGEXTRACT_EXTRACTION_PASSES
+    max_workers = max_workers or LANGEXTRACT_MAX_WORKERS
+    max_char_buffer = max_char_buffer or LANGEXTRACT_CHAR_BUFFER or _char_buffer_for(len(clean_text))
+
     result = lx.extract(
         text_or_documents=clean_text,
         prompt_description=prompt_desc,
         examples=examples,
         model_id="gemini-2.5-pro",  # Explicitly specify the model
-        extraction_passes=3,     # improves recall on long docs
-        max_workers=8,           # parallel requests
-        max_char_buffer=1000     # controls chunk size
+        extraction_passes=extraction_passes,  # improves recall on long docs
+        max_workers=max_workers,  # parallel requests
+        # chunks per batch; parallelism is min(batch_length, max_workers)
+        batch_length=max(max_workers, 10),
+        max_char_buffer=max_char_buffer,  # controls chunk size
     )
     # Some versions may return a tuple (result, metadata) or a list of results
     return result
 
+def run_langextract_batch(texts: list, prompt_desc: str, examples, **kw) -> list:
+    """
+    run_langextract over several documents, one LangExtract call per chunk size: the
+    chunks in a call share one worker pool, which stays full even when each document
+    alone has fewer chunks than max_workers. Texts are grouped by the chunk size they
+    would get on their own, so a long document doesn't coarsen short ones.
+    Returns one AnnotatedDocument per text, in input order.
+    Keyword arguments are as for run_langextract.
+    """
+    import langextract as lx
+
+    groups = {}
+    for i, text in enumerate(texts):
+        buffer = kw.get("max_char_buffer") or LANGEXTRACT_CHAR_BUFFER or _char_buffer_for(len(text))
+        groups.setdefault(buffer, []).append(i)
+
+    results = [None] * len(texts)
+    for buffer, indices in groups.items():
+        docs = [lx.data.Document(text=texts[i], document_id=f"doc_{i}") for i in indices]
+        by_id = {doc.document_id: doc
+                 for doc in run_langextract(docs, prompt_desc, examples, **{**kw, "max_char_buffer": buffer})}
+        for i, doc in zip(indices, docs):
+            results[i] = by_id[doc.document_id]
+    return results
+
 from pathlib import Path
 import datetime
 
@@ -112,16 +354,17 @@ def ensure_run_dir(base: str = "outputs") -> Path:
 def save_outputs(result, run_dir: Path):
     """
     Save annotated JSONL (entities + spans) then create the HTML visualization.
+    run_dir must already exist (see ensure_run_dir).
     Handles both single-document and list-of-documents results.
     """
-    run_dir.mkdir(parents=True, exist_ok=True)
+    import langextract as lx
 
     # Normalize result to a list of documents expected by langextract IO
-    if isinstance(result, (list, tuple)):
-        docs = list(result)
-        # Some APIs return (result, meta)
-        if len(docs) == 2 and hasattr(docs[0], "extractions") and not hasattr(docs[1], "extractions"):
-            docs = [docs[0]]
+    if isinstance(result, lx.data.AnnotatedDocument):
+        docs = [result]  # the usual case: lx.extract on a single text
+    elif isinstance(result, (list, tuple)):
+        # A list of documents, or (document, metadata) from some API versions
+        docs = [doc for doc in result if isinstance(doc, lx.data.AnnotatedDocument)]
     else:
         docs = [result]
 
@@ -134,59 +377,103 @@ def save_outputs(result, run_dir: Path):
         return
 
     try:
-        html = lx.visualize(str(run_dir / "extraction.jsonl"))
-        (run_dir / "review.html").write_text(html, encoding="utf-8")
+        # Visualize the in-memory document (the same first document the JSONL
+        # path would load) rather than re-reading and re-parsing the file
+        html = lx.visualize(docs[0])
+        # One encode straight to bytes, skipping the text-file layer
+        (run_dir / "review.html").write_bytes(html.encode("utf-8"))
     except Exception as e:
         (run_dir / "visualize_error.txt").write_text(f"visualize failed: {e}\n", encoding="utf-8")
 
+# Known company to industry mappings that Docling might miss
+# Include both full names and partial names that might be extracted
+_COMPANY_INDUSTRY = {
+    # Full company names
+    "Global Packaging Solutions, Inc.": "Containers & Packaging",
+    "Global Packaging Solutions": "Containers & Packaging",
+    "Global Packaging": "Containers & Packaging",
+    "Solutions, Inc.": "Containers & Packaging",  # Partial name from split
+    # Add other companies that might have similar issues
+    "Innovate Medical Research Center LLC": "Health Care Providers & Services",
+    "Innovate Medical Research": "Health Care Providers & Services",  # Partial name
+    "Medical Research Center LLC": "Health Care Providers & Services",  # Partial name
+}
+
+# A name matches a pattern if either contains the other; the first pattern in
+# mapping order wins. "pattern in name" is one alternation scan (the lookahead
+# tries every start position, and alternation picks the earliest pattern there);
+# "name in pattern" is one find() over all patterns joined by NULs.
+_COMPANY_PATTERNS = tuple(_COMPANY_INDUSTRY)
+_COMPANY_RANK = {pattern: i for i, pattern in enumerate(_COMPANY_PATTERNS)}
+_COMPANY_RE = re.compile("(?=(" + "|".join(map(re.escape, _COMPANY_PATTERNS)) + "))")
+_COMPANY_HAYSTACK = "\0".join(_COMPANY_PATTERNS)
+_COMPANY_STARTS = [0, *accumulate(len(pattern) + 1 for pattern in _COMPANY_PATTERNS[:-1])]
+
+def _known_company_industry(name: str):
+    """Industry for a known company name, including partial/split names"""
+    industry = _COMPANY_INDUSTRY.get(name)
+    if industry is not None:
+        return industry
+    best = len(_COMPANY_PATTERNS)
+    if "\0" not in name:
+        pos = _COMPANY_HAYSTACK.find(name)
+        if pos != -1:
+            best = bisect_right(_COMPANY_STARTS, pos) - 1
+    for m in _COMPANY_RE.finditer(name):
+        best = min(best, _COMPANY_RANK[m.group(1)])
+    return _COMPANY_INDUSTRY[_COMPANY_PATTERNS[best]] if best < len(_COMPANY_PATTERNS) else None
+
 def fix_known_extraction_issues(extractions):
     """
     Post-process extractions to fix known issues from Docling table parsing
     """
-    # Known company to industry mappings that Docling might miss
-    # Include both full names and partial names that might be extracted
-    company_industry_mapping = {
-        # Full company names
-        "Global Packaging Solutions, Inc.": "Containers & Packaging",
-        "Global Packaging Solutions": "Containers & Packaging",
-        "Global Packaging": "Containers & Packaging",
-        "Solutions, Inc.": "Containers & Packaging",  # Partial name from split
-        # Add other companies that might have similar issues
-        "Innovate Medical Research Center LLC": "Health Care Providers & Services",
-        "Innovate Medical Research": "Health Care Providers & Services",  # Partial name
-        "Medical Research Center LLC": "Health Care Providers & Services",  # Partial name
-    }
-    
-    # Apply fixes
+    import langextract as lx
+
+    # Apply fixes; new extractions are collected separately so the loop only
+    # visits the original ones
+    additions = []
     for ext in extractions:
-        cls = getattr(ext, "extraction_class", "")
-        txt = getattr(ext, "extraction_text", "")
+        cls = ext.extraction_class
+        txt = ext.extraction_text
         
         # Fix missing industry for known companies (including partial matches)
         if cls == "investment_name" and txt:
-            # Try exact match first
-            if txt in company_industry_mapping:
-                industry_name = company_industry_mapping[txt]
-            else:
-                # Try partial matching for split company names
-                industry_name = None
-                for company_pattern, industry in company_industry_mapping.items():
-                    if txt in company_pattern or company_pattern in txt:
-                        industry_name = industry
-                        break
-            
+            industry_name = _known_company_industry(txt)
             if industry_name:
                 # Add the missing industry extraction
-                from langextract import data
-                industry_ext = data.Extraction(
+                industry_ext = lx.data.Extraction(
                     extraction_class="industry",
                     extraction_text=industry_name,
                     attributes={}
                 )
-                extractions.append(industry_ext)
-    
+                additions.append(industry_ext)
+
+    extractions.extend(additions)
     return extractions
 
+class _NumericCharsTable(dict):
+    """
+    str.translate table that keeps only ASCII digits, "." and "-" - the same
+    characters re.sub(r"[^0-9.\-]", "", s) keeps. Entries are filled in on
+    first sight of each code point, so it covers all of Unicode.
+    """
+    def __missing__(self, codepoint):
+        keep = codepoint if chr(codepoint) in "0123456789.-" else None
+        self[codepoint] = keep
+        return keep
+
+_NUMERIC_CHARS = _NumericCharsTable()
+_YEAR_RE = re.compile(r"\d{4}")  # vintage_year: the first four-digit run
+
+# extraction_class -> destination, for the classes copied over as plain values
+_FUND_TEXT_FIELDS = frozenset({"fund_name", "domicile", "strategy", "gp_name"})
+_FEE_FIELDS = frozenset({"management_fee", "carry", "hurdle_rate", "catch_up"})
+_INVESTMENT_TEXT_FIELDS = frozenset({"industry", "country", "currency", "investment_date"})
+_INVESTMENT_NUMERIC_FIELDS = frozenset({"investment_cost", "fair_value", "ownership", "number_of_shares", "moic"})
+
+# Read-only stand-in for extractions without attributes (no dict built per extraction)
+_NO_ATTRIBUTES = MappingProxyType({})
+
 def normalize_to_schema(result, run_dir: Path):
     """
     Convert LangExtract's result into our Pydantic schema.
@@ -208,131 +495,69 @@ def normalize_to_schema(result, run_dir: Path):
     }
 
     # Group investment extractions by investment name AND type to handle same company with different investment types
-    investment_groups = {}
+    # (name, type) -> index into groups; a group dict is only built on first sight
+    group_ids = {}
+    groups = []
     current_investment_name = None
     current_investment_type = None
+    # Group of the current (name, type); reset whenever either changes
+    current_group = None
+
+    def group_for(key, name, inv_type=None):
+        gid = group_ids.get(key)
+        if gid is None:
+            gid = group_ids[key] = len(groups)
+            groups.append({"investment_name": name} if inv_type is None
+                          else {"investment_name": name, "investment_type": inv_type})
+        return groups[gid]
 
+    # Bind the output containers once rather than subscripting data per extraction
+    fund, fees, contacts, source_anchors = data["fund"], data["fees"], data["contacts"], data["source_anchors"]
+
+    # Extractions are lx.data.Extraction dataclasses, so read the fields directly
     for ext in extractions:
-        cls = getattr(ext, "extraction_class", "")
-        txt = getattr(ext, "extraction_text", "")
-        attrs = getattr(ext, "attributes", {}) or {}
+        cls = ext.extraction_class
+        txt = ext.extraction_text
+        attrs = ext.attributes or _NO_ATTRIBUTES
 
-        # Fund-level fields
-        if cls == "fund_name":
-            data["fund"]["fund_name"] = txt
+        if cls in _FUND_TEXT_FIELDS:
+            fund[cls] = txt
         elif cls == "vintage_year":
-            # try to parse int
-            try:
-                data["fund"]["vintage_year"] = int(re.sub(r"\D", "", txt))
-            except Exception:
-                data["fund"]["vintage_year"] = None
-        elif cls == "domicile":
-            data["fund"]["domicile"] = txt
-        elif cls == "strategy":
-            data["fund"]["strategy"] = txt
-        elif cls == "gp_name":
-            data["fund"]["gp_name"] = txt
-
-        # Fee fields
-        elif cls == "management_fee":
-            data["fees"]["management_fee"] = txt
-        elif cls == "carry":
-            data["fees"]["carry"] = txt
-        elif cls == "hurdle_rate":
-            data["fees"]["hurdle_rate"] = txt
-        elif cls == "catch_up":
-            data["fees"]["catch_up"] = txt
+            # "2019", "Vintage 2019" and "2019-03-31" all mean 2019
+            year = _YEAR_RE.search(txt) if txt else None
+            fund["vintage_year"] = int(year.group()) if year else None
+        elif cls in _FEE_FIELDS:
+            fees[cls] = txt
 
         # Investment fields - group by investment name AND type
         elif cls == "investment_name":
             current_investment_name = txt
-            # Create a unique key combining name and type
-            if current_investment_type:
-                unique_key = f"{txt}_{current_investment_type}"
-            else:
-                unique_key = txt
-            if unique_key not in investment_groups:
-                investment_groups[unique_key] = {"investment_name": txt}
+            current_group = None
+            # Until a type has been seen the group is keyed on the name alone
+            group_for((txt, current_investment_type or None), txt)
         elif cls == "investment_type":
             current_investment_type = txt
+            current_group = None
             if current_investment_name:
-                unique_key = f"{current_investment_name}_{txt}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name}
-                investment_groups[unique_key]["investment_type"] = txt
-        elif cls == "industry":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["industry"] = txt
-        elif cls == "country":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["country"] = txt
-        elif cls == "currency":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["currency"] = txt
-        elif cls == "investment_date":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["investment_date"] = txt
-        elif cls == "investment_cost":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["investment_cost"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["investment_cost"] = None
-        elif cls == "fair_value":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["fair_value"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["fair_value"] = None
-        elif cls == "ownership":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    pct = re.sub(r"[^0-9.\-]", "", txt)
-                    investment_groups[unique_key]["ownership"] = float(pct)
-                except Exception:
-                    investment_groups[unique_key]["ownership"] = None
-        elif cls == "number_of_shares":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["number_of_shares"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["number_of_shares"] = None
-        elif cls == "moic":
+                group_for((current_investment_name, txt), current_investment_name)["investment_type"] = txt
+        elif cls in _INVESTMENT_TEXT_FIELDS or cls in _INVESTMENT_NUMERIC_FIELDS:
             if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["moic"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["moic"] = None
+                if current_group is None:
+                    current_group = group_for(
+                        (current_investment_name, current_investment_type),
+                        current_investment_name,
+                        current_investment_type,
+                    )
+                if cls in _INVESTMENT_NUMERIC_FIELDS:
+                    try:
+                        current_group[cls] = float(txt.translate(_NUMERIC_CHARS))
+                    except (ValueError, AttributeError):  # unparsable / missing text
+                        current_group[cls] = None
+                else:
+                    current_group[cls] = txt
 
         elif cls == "contact":
-            data["contacts"].append({
+            contacts.append({
                 "name": txt,
                 "title": attrs.get("title"),
                 "email": attrs.get("email"),
@@ -341,16 +566,16 @@ def normalize_to_schema(result, run_dir: Path):
 
         # collect any anchors if present in attributes
         if "anchor" in attrs:
-            data["source_anchors"].append(attrs["anchor"])
+            source_anchors.append(attrs["anchor"])
 
     # Convert investment groups to list
-    data["investments"] = list(investment_groups.values())
+    data["investments"] = groups
 
-    # Create the schema object
-    from schema import FundDocExtraction
-    model = FundDocExtraction(**data)
+    # Create the schema object in one validation pass. This schema has a single
+    # `investment` field, so validation ignores the extra data["investments"] key
+    model = FundDocExtraction.model_validate(data)
     
     # Save the normalized data
-    (run_dir / "normalized.json").write_text(model.model_dump_json(indent=2), encoding="utf-8")
+    (run_dir / "normalized.json").write_bytes(orjson.dumps(model.model_dump(mode="json"), option=orjson.OPT_INDENT_2))
     
     return model
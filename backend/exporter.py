@@ -1,14 +1,35 @@
 # exporters.py
 from __future__ import annotations
 from pathlib import Path
+import csv
+import os
 import uuid
-import pandas as pd
 from typing import Dict, Any, List
 from schema import FundDocExtraction
 
+# Investment attributes exported as CSV columns (after investment_id/fund_id)
+INVESTMENT_FIELDS = (
+    "investment_name",
+    "investment_type",
+    "industry",
+    "country",
+    "currency",
+    "investment_date",
+    "investment_cost",
+    "fair_value",
+    "ownership",
+    "number_of_shares",
+    "moic",
+)
+
 def _uuid(prefix: str) -> str:
     return f"{prefix}_{uuid.uuid4().hex[:8]}"
 
+def _uuids(prefix: str, n: int) -> List[str]:
+    """Generate n short random IDs from a single os.urandom call (one syscall, not n)"""
+    buf = os.urandom(4 * n)
+    return [f"{prefix}_{buf[i:i + 4].hex()}" for i in range(0, 4 * n, 4)]
+
 def _company_investment_id(company_name: str, investment_type: str, prefix: str = "inv") -> str:
     """
     Generate a consistent investment ID based on company name and investment type.
@@ -26,7 +47,12 @@ def _company_investment_id(company_name: str, investment_type: str, prefix: str
     
     return f"{prefix}_{company_hash}_{type_suffix}"
 
-def to_relational_rows(model: FundDocExtraction, fund_id: str) -> Dict[str, List[Dict[str, Any]]]:
+def to_relational_rows(model: FundDocExtraction, fund_id: str) -> Dict[str, Any]:
+    """
+    Flatten the extraction into relational tables. Each table is either a list
+    of row dicts or, for the potentially large investments table, a dict of
+    column lists - both are accepted by write_csvs.
+    """
     # ---- fund table (1 row)
     fund_row = {
         "fund_id": fund_id,
@@ -38,25 +64,16 @@ def to_relational_rows(model: FundDocExtraction, fund_id: str) -> Dict[str, List
         "strategy": model.fund.strategy,
     }
     
-    # ---- investment table (0..N rows)
-    investment_rows = []
-    for investment in model.investments:
-        investment_row = {
-            "investment_id": _company_investment_id(investment.investment_name, investment.investment_type),
-            "fund_id": fund_id,
-            "investment_name": investment.investment_name,
-            "investment_type": investment.investment_type,
-            "industry": investment.industry,
-            "country": investment.country,
-            "currency": investment.currency,
-            "investment_date": investment.investment_date,
-            "investment_cost": investment.investment_cost,
-            "fair_value": investment.fair_value,
-            "ownership": investment.ownership,
-            "number_of_shares": investment.number_of_shares,
-            "moic": investment.moic,
-        }
-        investment_rows.append(investment_row)
+    # ---- investment table (0..N rows), built column-wise (one list per
+    # attribute) so pandas can construct the frame straight from the arrays
+    investments = model.investments
+    n = len(investments)
+    investment_columns = {
+        "investment_id": [_company_investment_id(i.investment_name, i.investment_type) for i in investments],
+        "fund_id": [fund_id] * n,
+    }
+    for field in INVESTMENT_FIELDS:
+        investment_columns[field] = [getattr(i, field) for i in investments]
     
     # ---- fees table (1 row)
     fee_row = {
@@ -70,9 +87,9 @@ def to_relational_rows(model: FundDocExtraction, fund_id: str) -> Dict[str, List
 
     # ---- contacts table (0..N)
     contact_rows = []
-    for c in model.contacts:
+    for contact_id, c in zip(_uuids("ctc", len(model.contacts)), model.contacts):
         contact_rows.append({
-            "contact_id": _uuid("ctc"),
+            "contact_id": contact_id,
             "fund_id": fund_id,
             "name": c.name,
             "title": c.title,
@@ -83,94 +100,141 @@ def to_relational_rows(model: FundDocExtraction, fund_id: str) -> Dict[str, List
     # ---- sources table (0..N)
     source_rows = []
     if model.source_anchors:
-        for a in model.source_anchors:
+        for source_id, a in zip(_uuids("src", len(model.source_anchors)), model.source_anchors):
             source_rows.append({
-                "source_id": _uuid("src"),
+                "source_id": source_id,
                 "fund_id": fund_id,
                 "anchor": a,
             })
 
     return {
         "fund": [fund_row],
-        "investments": investment_rows,  # Changed from single investment to list
+        "investments": investment_columns,  # columnar: {column: [values]}
         "fees": [fee_row],
         "contacts": contact_rows,
         "sources": source_rows,
     }
 
-def write_csvs(tables: Dict[str, List[Dict[str, Any]]], out_dir: Path) -> None:
+# Tables larger than this go through pandas; smaller ones are written with
+# the stdlib csv module so the common case never pays pandas' import cost
+PANDAS_MIN_ROWS = 64
+
+def _row_count(rows) -> int:
+    if isinstance(rows, dict):
+        return len(next(iter(rows.values()), []))
+    return len(rows)
+
+def _write_small_csv(path: Path, rows) -> None:
+    """Write a list of row dicts, or a dict of column lists, with csv.writer"""
+    if isinstance(rows, dict):
+        fieldnames = list(rows)
+        records = zip(*rows.values())
+    else:
+        fieldnames = list(rows[0]) if rows else []
+        records = ([row.get(k) for k in fieldnames] for row in rows)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        if fieldnames:
+            writer.writerow(fieldnames)
+        writer.writerows(records)
+
+def write_csvs(tables: Dict[str, Any], out_dir: Path) -> None:
     out_dir.mkdir(parents=True, exist_ok=True)
     for name, rows in tables.items():
-        df = pd.DataFrame(rows)
-        (out_dir / f"{name}.csv").write_text("", encoding="utf-8") if df.empty else None
-        df.to_csv(out_dir / f"{name}.csv", index=False)
+        path = out_dir / f"{name}.csv"
+        if _row_count(rows) <= PANDAS_MIN_ROWS:
+            _write_small_csv(path, rows)
+        else:
+            import pandas as pd
+            pd.DataFrame(rows).to_csv(path, index=False, lineterminator="\n")
 
 # ---- Optional: generate a simple PDF report for humans
+# Built with Platypus flowables: ReportLab handles layout, wrapping and
+# pagination (repeating table headers) instead of one drawString per line.
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+_TABLE_STYLE = TableStyle([
+    ("FONT", (0, 0), (-1, 0), "Helvetica-Bold", 9),
+    ("FONT", (0, 1), (-1, -1), "Helvetica", 8),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+])
+
+_KV_STYLE = TableStyle([
+    ("FONT", (0, 0), (0, -1), "Helvetica-Bold", 10),
+    ("FONT", (1, 0), (1, -1), "Helvetica", 10),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+])
+
+def _fmt(value) -> str:
+    return "" if value is None else str(value)
 
 def write_pdf_report(model: FundDocExtraction, pdf_path: Path, fund_id: str):
-    pdf = canvas.Canvas(str(pdf_path), pagesize=A4)
-    width, height = A4
-    x, y = 2*cm, height - 2*cm
-
-    def line(txt: str):
-        nonlocal y
-        pdf.drawString(x, y, txt if txt is not None else "")
-        y -= 0.7*cm
-        if y < 2*cm:
-            pdf.showPage()
-            y = height - 2*cm
-
-    pdf.setTitle(f"Fund Extraction Report - {fund_id}")
-    pdf.setFont("Helvetica-Bold", 14)
-    line(f"Fund Extraction Report")
-    pdf.setFont("Helvetica", 10)
-    line(f"Run ID (fund_id): {fund_id}")
-    line("")
-
-    pdf.setFont("Helvetica-Bold", 12)
-    line("Fund")
-    pdf.setFont("Helvetica", 10)
-    line(f"Name: {model.fund.fund_name}")
-    line(f"Vintage year: {model.fund.vintage_year}")
-    line(f"GP: {model.fund.gp_name}")
-    line(f"Domicile: {model.fund.domicile}")
-    line(f"Strategy: {model.fund.strategy}")
-    line("")
-
-    pdf.setFont("Helvetica-Bold", 12)
-    line("Fees")
-    pdf.setFont("Helvetica", 10)
-    line(f"Management fee: {model.fees.management_fee}")
-    line(f"Carry: {model.fees.carry}")
-    line(f"Hurdle rate: {model.fees.hurdle_rate}")
-    line(f"Catch up: {model.fees.catch_up}")
-    line("")
+    styles = getSampleStyleSheet()
+    cell = styles["BodyText"].clone("cell", fontSize=8, leading=10)
+
+    def text(value, style=cell):
+        return Paragraph(escape(_fmt(value)), style)
+
+    def key_values(pairs):
+        return Table([[label, text(value, styles["BodyText"])] for label, value in pairs],
+                     colWidths=[4 * cm, None], style=_KV_STYLE, hAlign="LEFT")
+
+    story = [
+        Paragraph("Fund Extraction Report", styles["Title"]),
+        Paragraph(escape(f"Run ID (fund_id): {fund_id}"), styles["Normal"]),
+        Spacer(1, 0.5 * cm),
+        Paragraph("Fund", styles["Heading2"]),
+        key_values([
+            ("Name", model.fund.fund_name),
+            ("Vintage year", model.fund.vintage_year),
+            ("GP", model.fund.gp_name),
+            ("Domicile", model.fund.domicile),
+            ("Strategy", model.fund.strategy),
+        ]),
+        Paragraph("Fees", styles["Heading2"]),
+        key_values([
+            ("Management fee", model.fees.management_fee),
+            ("Carry", model.fees.carry),
+            ("Hurdle rate", model.fees.hurdle_rate),
+            ("Catch up", model.fees.catch_up),
+        ]),
+    ]
 
     if model.investments:
-        pdf.setFont("Helvetica-Bold", 12)
-        line("Investments")
-        pdf.setFont("Helvetica", 10)
-        for inv in model.investments:
-            line(f"- {inv.investment_name} | {inv.investment_type} | {inv.industry} | {inv.country}")
-            line(f"  Cost: {inv.investment_cost} | Fair Value: {inv.fair_value} | Ownership: {inv.ownership}%")
-        line("")
+        rows = [["Name", "Type", "Industry", "Country", "Cost", "Fair Value", "Own %"]]
+        rows += [
+            [text(inv.investment_name), text(inv.investment_type), text(inv.industry), text(inv.country),
+             _fmt(inv.investment_cost), _fmt(inv.fair_value), _fmt(inv.ownership)]
+            for inv in model.investments
+        ]
+        story += [
+            Paragraph("Investments", styles["Heading2"]),
+            Table(rows, repeatRows=1, style=_TABLE_STYLE,
+                  colWidths=[3.6 * cm, 2.2 * cm, 2.6 * cm, 2.2 * cm, 2.3 * cm, 2.3 * cm, 1.5 * cm]),
+        ]
 
     if model.contacts:
-        pdf.setFont("Helvetica-Bold", 12)
-        line("Contacts")
-        pdf.setFont("Helvetica", 10)
-        for c in model.contacts:
-            line(f"- {c.name} | {c.title} | {c.email} | {c.phone}")
-        line("")
+        rows = [["Name", "Title", "Email", "Phone"]]
+        rows += [[text(c.name), text(c.title), text(c.email), text(c.phone)] for c in model.contacts]
+        story += [
+            Paragraph("Contacts", styles["Heading2"]),
+            Table(rows, repeatRows=1, style=_TABLE_STYLE),
+        ]
 
     if model.source_anchors:
-        pdf.setFont("Helvetica-Bold", 12)
-        line("Source anchors")
-        pdf.setFont("Helvetica", 10)
-        for a in model.source_anchors:
-            line(f"- {a}")
-
-    pdf.save()
+        story.append(Paragraph("Source anchors", styles["Heading2"]))
+        story += [Paragraph(escape(f"- {a}"), styles["BodyText"]) for a in model.source_anchors]
+
+    doc = SimpleDocTemplate(
+        str(pdf_path), pagesize=A4,
+        leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+        title=f"Fund Extraction Report - {fund_id}",
+    )
+    doc.build(story)
@@ -2,11 +2,23 @@
 """
 Script to fix the frontend display by adding the processed result to the backend
 """
-import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from datetime import datetime
 
+BACKEND_URL = "http://localhost:8000"
+
+# Keep-alive session: repeated posts reuse the connection, and transient
+# gateway errors are retried with backoff instead of falling through
+session = requests.Session()
+session.mount("http://", HTTPAdapter(
+    pool_connections=8,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=None),
+))
+
 def add_result_to_backend():
     """Add the Peak Credit Fund result to the backend"""
     
@@ -21,8 +33,7 @@ def add_result_to_backend():
         print(f"❌ Error: {normalized_path} not found")
         return False
     
-    with open(normalized_path, 'r') as f:
-        normalized_data = json.load(f)
+    normalized_data = orjson.loads(normalized_path.read_bytes())
     
     # Create downloads URLs
     downloads = {
@@ -33,27 +44,34 @@ def add_result_to_backend():
     
     # Create preview data
     investments = normalized_data.get("investments", [])
+    # One pass builds the preview rows and accumulates the totals
+    preview_investments = []
+    total_cost = 0
+    total_fair_value = 0
+    for inv in investments:
+        cost = inv.get("investment_cost", 0)
+        fair_value = inv.get("fair_value", 0)
+        total_cost += cost or 0
+        total_fair_value += fair_value or 0
+        preview_investments.append({
+            "name": inv.get("investment_name", ""),
+            "type": inv.get("investment_type", ""),
+            "industry": inv.get("industry", ""),
+            "country": inv.get("country", ""),
+            "cost": cost,
+            "fair_value": fair_value,
+            "ownership": inv.get("ownership", None),
+        })
     preview = {
         "fund": {
             "name": normalized_data.get("fund", {}).get("fund_name", "Unknown"),
             "reporting_period": normalized_data.get("fund", {}).get("fund_reporting_period", "Not specified"),
         },
-        "investments": [
-            {
-                "name": inv.get("investment_name", ""),
-                "type": inv.get("investment_type", ""),
-                "industry": inv.get("industry", ""),
-                "country": inv.get("country", ""),
-                "cost": inv.get("investment_cost", 0),
-                "fair_value": inv.get("fair_value", 0),
-                "ownership": inv.get("ownership", None),
-            }
-            for inv in investments
-        ],
+        "investments": preview_investments,
         "summary": {
             "total_investments": len(investments),
-            "total_cost": sum(inv.get("investment_cost", 0) or 0 for inv in investments),
-            "total_fair_value": sum(inv.get("fair_value", 0) or 0 for inv in investments),
+            "total_cost": total_cost,
+            "total_fair_value": total_fair_value,
         }
     }
     
@@ -71,20 +89,20 @@ def add_result_to_backend():
     
     # Try to add via API endpoint
     try:
-        response = requests.post("http://localhost:8000/api/add-result")
+        response = session.post(f"{BACKEND_URL}/api/add-result", timeout=10)
         if response.status_code == 200:
             print("✅ Result added via API endpoint")
             return True
-    except:
-        pass
+        print(f"⚠️  API endpoint returned {response.status_code}")
+    except requests.RequestException as e:
+        print(f"⚠️  API request failed: {e}")
     
     # If API endpoint doesn't work, try to modify the server directly
     print("⚠️  API endpoint not available, trying direct modification...")
     
     # Create a temporary file with the result data
     temp_file = Path("temp_result.json")
-    with open(temp_file, 'w') as f:
-        json.dump(result, f, indent=2)
+    temp_file.write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
     
     print(f"📁 Result data saved to {temp_file}")
     print(f"📊 {len(investments)} investments processed")
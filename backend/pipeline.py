@@ -6,68 +6,299 @@ No Docling needed - direct PDF to markdown via Vision, then structured extractio
 import argparse
 import os
 from pathlib import Path
-import json
-import base64
+import orjson
+import io
 from dotenv import load_dotenv
 import google.generativeai as genai
 import fitz  # PyMuPDF for PDF page extraction
-import langextract as lx
 from schema import FundDocExtraction, FundEntity, FeeTerms, KeyContacts, Investment
+from cache import ExtractionCache, vision_key, DEFAULT_VISION_CACHE_DIR
 import re
 import datetime
+import functools
+import threading
+import multiprocessing
+import time
+import random
+from itertools import chain
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from google.api_core import exceptions as google_exceptions
 
 load_dotenv()
 
+# Model used for LangExtract structured extraction
+LANGEXTRACT_MODEL_ID = "gemini-2.5-pro"
+# Model used to turn PDF page images into markdown
+VISION_MODEL_ID = "gemini-2.5-pro"
+
+# Embedding model used to detect near-duplicate documents (semantic cache)
+EMBEDDING_MODEL_ID = "models/text-embedding-004"
+
+# Max number of Gemini Vision requests in flight at once
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "8"))
+# Retries (with exponential backoff) on rate-limit / transient server errors
+VISION_MAX_RETRIES = int(os.getenv("VISION_MAX_RETRIES", "3"))
+# Process-wide cap on Gemini Vision/embedding requests per second, shared by all
+# concurrent jobs (0 = no cap); keeps bursts under the per-minute quota
+GEMINI_RPS = float(os.getenv("GEMINI_RPS", "0"))
+# Longest single backoff sleep, in seconds
+VISION_MAX_RETRY_DELAY = float(os.getenv("VISION_MAX_RETRY_DELAY", "30"))
+# LangExtract splits the markdown into chunks of ~LANGEXTRACT_CHAR_BUFFER chars
+# and extracts up to LANGEXTRACT_MAX_WORKERS chunks concurrently
+LANGEXTRACT_MAX_WORKERS = int(os.getenv("LANGEXTRACT_MAX_WORKERS", "16"))
+# 0 = pick the chunk size from the text length (see _char_buffer_for)
+LANGEXTRACT_CHAR_BUFFER = int(os.getenv("LANGEXTRACT_CHAR_BUFFER", "0"))
+# Full extraction passes over the text; each extra pass improves recall on long
+# documents and costs another round of requests
+LANGEXTRACT_EXTRACTION_PASSES = int(os.getenv("LANGEXTRACT_EXTRACTION_PASSES", "3"))
+# LangExtract's Gemini provider retries each chunk on 429/5xx with its own backoff
+LANGEXTRACT_MAX_RETRIES = int(os.getenv("LANGEXTRACT_MAX_RETRIES", "5"))
+# Page image format sent to Vision: "png" (lossless; about as small for text/table pages)
+# or "jpeg" (several times smaller for photo-heavy or scanned pages)
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "png").lower()
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+# Render pages as 8-bit grayscale: a third of the raw pixel data of RGB, roughly half
+# the PNG size and encode time, and fund reports carry no meaning in colour
+VISION_GRAYSCALE = os.getenv("VISION_GRAYSCALE", "1") == "1"
+# Crop each page to the bounding box of its drawn content (text, images, lines)
+# before rasterizing, so blank margins are neither rendered nor sent
+VISION_CLIP_TO_CONTENT = os.getenv("VISION_CLIP_TO_CONTENT", "1") == "1"
+# Gemini rejects requests over 20 MB; above this many bytes of page images a
+# request's images go through the Files API instead of inline
+VISION_INLINE_MAX_BYTES = int(os.getenv("VISION_INLINE_MAX_BYTES", str(18 * 1024 * 1024)))
+# Skip requested investment pages whose text layer shows they hold no schedule
+# of investments (see _investment_pages); scanned pages are always kept
+VISION_SKIP_NON_INVESTMENT_PAGES = os.getenv("VISION_SKIP_NON_INVESTMENT_PAGES", "1") == "1"
+_INVESTMENT_PAGE_KEYWORDS = (
+    "schedule of investments",
+    "valuation report",
+    "portfolio holdings",
+    "portfolio investments",
+    "investment schedule",
+)
+# Page rendering is spread over up to RENDER_WORKERS processes, each taking at
+# least RENDER_PARALLEL_MIN_PAGES pages (handing a few pages to a worker costs more
+# than rendering them, unless the caller asks to keep rendering off its own thread)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_PARALLEL_MIN_PAGES = int(os.getenv("RENDER_PARALLEL_MIN_PAGES", "4"))
+# Send fund info and investment pages in one request instead of two concurrent ones
+# (halves Vision requests against the quota; latency is about the same)
+VISION_SINGLE_REQUEST = os.getenv("VISION_SINGLE_REQUEST", "0") == "1"
+# Vision responses are cached on disk by (model, prompt, page image bytes);
+# set VISION_CACHE_DIR to an empty string to disable
+VISION_CACHE_DIR = os.getenv("VISION_CACHE_DIR", DEFAULT_VISION_CACHE_DIR)
+# Least recently used Vision responses beyond this many are evicted
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "1000"))
+_vision_cache = ExtractionCache(VISION_CACHE_DIR, max_entries=VISION_CACHE_MAX_ENTRIES) if VISION_CACHE_DIR else None
+
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,   # 429 / quota
+    google_exceptions.TooManyRequests,     # 429
+    google_exceptions.ServiceUnavailable,  # 503
+    google_exceptions.InternalServerError, # 500
+    google_exceptions.DeadlineExceeded,    # 504
+)
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Some SDK paths surface quota errors as plain exceptions; match on the message
+# as a last resort (429 only as a whole number, not inside e.g. a byte count)
+_RATE_LIMIT_RE = re.compile(r"\b429\b|quota|rate[ _-]?limit|resource[ _]exhausted", re.IGNORECASE)
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, _RETRYABLE_ERRORS):
+        return True
+    status = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status in _RETRYABLE_STATUS_CODES
+    return bool(_RATE_LIMIT_RE.search(str(e)))
+
+class _RateLimiter:
+    """Thread-safe token bucket: `rate` requests per second, bursting up to one second's worth"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_gemini_limiter = _RateLimiter(GEMINI_RPS) if GEMINI_RPS > 0 else None
+
+# (api key, Gemini Vision model) shared by every document - see setup_gemini
+_gemini_model = None
+_gemini_model_lock = threading.Lock()
+
 def setup_gemini():
-    """Setup Gemini Vision API"""
+    """
+    Setup Gemini Vision API.
+    The SDK is configured and the model built once per API key, then reused, so
+    jobs share the SDK's connections and never re-configure the global client
+    while another job's requests are in flight.
+    """
+    global _gemini_model
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("LANGEXTRACT_API_KEY")
     if not api_key:
         raise ValueError("Please set GOOGLE_API_KEY or LANGEXTRACT_API_KEY environment variable")
     
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-pro')
-    return model
+    with _gemini_model_lock:
+        if _gemini_model is None or _gemini_model[0] != api_key:
+            genai.configure(api_key=api_key)
+            _gemini_model = (api_key, genai.GenerativeModel(VISION_MODEL_ID))
+        return _gemini_model[1]
+
+def _content_clip(page, margin: float = 12):
+    """
+    Bounding box of everything drawn on the page, padded by margin points,
+    or None for a blank page. Full-page background fills are ignored;
+    full-page images (scans) are kept, which makes the clip the whole page.
+    """
+    page_rect = page.rect
+    page_area = page_rect.get_area()
+    content = fitz.Rect()
+    for kind, bbox in page.get_bboxlog():
+        if kind.startswith("ignore"):
+            continue  # invisible content, e.g. text with render mode 3
+        rect = fitz.Rect(bbox) & page_rect
+        if kind.endswith("-path") and rect.get_area() >= 0.95 * page_area:
+            continue  # page background
+        content |= rect
+    if content.is_empty:
+        return None
+    return (content + (-margin, -margin, margin, margin)) & page_rect
+
+def _render_pages(pdf_path: str, page_nums: list, dpi: int) -> list:
+    """Rasterize the given 0-indexed pages with their own document handle (runs in a worker process)"""
+    with fitz.open(pdf_path) as doc:
+        return _render_doc_pages(doc, page_nums, dpi)
+
+def _render_doc_pages(doc, page_nums: list, dpi: int) -> list:
+    """Rasterize the given 0-indexed pages of an open document"""
+    zoom = dpi / 72  # PDF user space is 72 dpi
+    matrix = fitz.Matrix(zoom, zoom)
+    colorspace = fitz.csGRAY if VISION_GRAYSCALE else fitz.csRGB
+    images = []
+    for page_num in page_nums:
+        page = doc.load_page(page_num)
+        clip = _content_clip(page) if VISION_CLIP_TO_CONTENT else None
+        pix = page.get_pixmap(matrix=matrix, colorspace=colorspace, clip=clip)
+        if VISION_IMAGE_FORMAT == "jpeg":
+            img_data, mime_type = pix.tobytes("jpeg", jpg_quality=VISION_JPEG_QUALITY), "image/jpeg"
+        else:
+            img_data, mime_type = pix.tobytes("png"), "image/png"
+        del pix, page  # release the bitmap before rendering the next page
+        images.append({
+            "page": page_num + 1,  # Convert to 1-indexed for display
+            "image_data": img_data,
+            "mime_type": mime_type,
+            "page_type": "fund_info" if page_num == 0 else "investments"
+        })
+    return images
+
+def _investment_pages(doc, page_nums: list) -> list:
+    """
+    Drop investment pages (anything but page 0) that have a text layer without
+    any _INVESTMENT_PAGE_KEYWORDS heading, unless they directly follow a kept
+    page (schedules continue over several pages without repeating the title).
+    Returns page_nums unchanged if no page matches, so odd layouts still work.
+    """
+    kept, matched = [], False
+    for n in page_nums:
+        if n == 0:
+            kept.append(n)
+            continue
+        text = doc.load_page(n).get_text("text").lower()
+        if any(keyword in text for keyword in _INVESTMENT_PAGE_KEYWORDS):
+            matched = True
+            kept.append(n)
+        elif not text.strip() or (kept and kept[-1] == n - 1 and kept[-1] != 0):
+            kept.append(n)  # scanned page (no text to judge by) or a continuation
+    if not matched:
+        return page_nums
+    skipped = [n + 1 for n in page_nums if n not in kept]
+    if skipped:
+        print(f"Skipping pages without an investment schedule: {skipped}")
+    return kept
 
-def extract_pdf_pages_as_images(pdf_path: str, page_ranges: list = None) -> list:
+# Render worker processes, started on first use and kept for later documents
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _render_executor() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn rather than fork: the API server gets here from a job thread,
+            # with its logging, job and gRPC threads running
+            _render_pool = ProcessPoolExecutor(max_workers=max(1, RENDER_WORKERS),
+                                               mp_context=multiprocessing.get_context("spawn"))
+        return _render_pool
+
+def _discard_render_executor(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died, so the next render starts a fresh one"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_pdf_pages_as_images(pdf_path: str, page_ranges: list = None, dpi: int = 150,
+                                offload: bool = False) -> list:
     """
     Extract specific page ranges from PDF as images
     page_ranges: list of tuples [(start_page, end_page), ...] where pages are 0-indexed
     Default: [(0, 0), (6, 7)] - first page for fund info, pages 7-8 for investments
+    Only the requested pages are loaded and rasterized; dpi controls render resolution.
+    Large page selections are rendered across a process pool (PyMuPDF is not
+    thread-safe, and holds the GIL while rendering). offload always renders in
+    the pool, so a threaded caller (the API server) keeps the GIL free.
     """
     if page_ranges is None:
         page_ranges = [(0, 0), (6, 7)]  # Default: first page + investment pages
     
-    doc = fitz.open(pdf_path)
-    images = []
-    
-    for start_page, end_page in page_ranges:
-        for page_num in range(start_page, end_page + 1):
-            if page_num < len(doc):
-                page = doc.load_page(page_num)
-                # Render page as image with higher resolution
-                pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))  # 2x zoom for better quality
-                img_data = pix.tobytes("png")
-                images.append({
-                    "page": page_num + 1,  # Convert to 1-indexed for display
-                    "image_data": img_data,
-                    "page_type": "fund_info" if page_num == 0 else "investments"
-                })
-    
-    doc.close()
-    return images
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        # Overlapping ranges name some pages twice; render (and send) each page once, in first-seen order
+        page_nums = [n for n in dict.fromkeys(chain.from_iterable(range(start, end + 1) for start, end in page_ranges))
+                     if n < page_count]
+        if VISION_SKIP_NON_INVESTMENT_PAGES:
+            page_nums = _investment_pages(doc, page_nums)
 
-def vision_to_markdown(model, images: list) -> str:
-    """Use Gemini Vision to convert PDF pages to structured markdown"""
-    
-    # Separate fund info and investment pages
-    fund_info_images = [img for img in images if img.get("page_type") == "fund_info"]
-    investment_images = [img for img in images if img.get("page_type") == "investments"]
-    
-    markdown_content = ""
-    
-    # Extract fund information from first page
-    if fund_info_images:
-        fund_prompt = """
+        workers = min(RENDER_WORKERS, len(page_nums) // RENDER_PARALLEL_MIN_PAGES)
+        if workers <= 1 and not (offload and page_nums):
+            # Render here, with the handle already open for the page filter
+            return _render_doc_pages(doc, page_nums, dpi)
+
+    # One contiguous slice of pages per worker, so each process opens the PDF once
+    step = -(-len(page_nums) // max(1, workers))
+    slices = [page_nums[i:i + step] for i in range(0, len(page_nums), step)]
+    for attempt in range(2):
+        pool = _render_executor()
+        try:
+            rendered = list(pool.map(_render_pages, [pdf_path] * len(slices), slices, [dpi] * len(slices)))
+            break
+        except BrokenProcessPool:
+            # A worker died (out of memory, or a page that crashes MuPDF) and took
+            # the pool with it; retry once on a fresh pool, then give up
+            _discard_render_executor(pool)
+            if attempt:
+                raise
+            print("Render worker died, retrying with a fresh pool")
+    return [img for chunk in rendered for img in chunk]
+
+FUND_INFO_PROMPT = """
 You are a financial data extraction expert. I have the first page of a fund report.
 
 Please extract the fund name and reporting period from this page. Look for:
@@ -81,23 +312,8 @@ Convert to markdown format:
 
 Please extract from the provided PDF page:
 """
-        
-        try:
-            content_parts = [fund_prompt]
-            for img in fund_info_images:
-                content_parts.append({
-                    "mime_type": "image/png",
-                    "data": base64.b64encode(img["image_data"]).decode('utf-8')
-                })
-            
-            response = model.generate_content(content_parts)
-            markdown_content += response.text + "\n\n"
-        except Exception as e:
-            print(f"Error extracting fund info: {e}")
-    
-    # Extract investment details from investment pages
-    if investment_images:
-        investment_prompt = """
+
+INVESTMENT_PROMPT = """
 You are a financial data extraction expert. I have PDF pages showing investment details, portfolio valuation, or schedule of investments from a financial statement.
 
 IMPORTANT: Only extract CURRENT investments from sections like "Unaudited Valuation Report", "Schedule of Investments", "Portfolio Holdings", or similar sections that show actual current investments. DO NOT extract from "Future Pipeline", "Investment Pipeline", "Deal Flow", or similar sections that show planned/future investments.
@@ -133,56 +349,173 @@ Example format:
 
 Please convert the provided PDF pages to markdown, focusing ONLY on current investments:
 """
-        
+
+COMBINED_PROMPT = f"""
+You will receive several PDF pages. The FIRST image is the first page of a fund report;
+the REMAINING images are investment pages. Complete both sections below, in order,
+and output them as one markdown document.
+
+## Section A - first image only
+{FUND_INFO_PROMPT}
+## Section B - remaining images only
+{INVESTMENT_PROMPT}"""
+
+# Everything besides the PDF, page ranges and dpi that shapes the Vision markdown.
+# Part of the extraction cache key, so changing any of it misses the cache; bump
+# the leading version when page selection or rendering code changes behaviour
+VISION_SETTINGS = repr((
+    2,  # overlapping page ranges deduplicated, non-investment pages filterable
+    VISION_MODEL_ID,
+    FUND_INFO_PROMPT,
+    INVESTMENT_PROMPT,
+    VISION_SINGLE_REQUEST,
+    VISION_SKIP_NON_INVESTMENT_PAGES,
+    VISION_GRAYSCALE,
+    VISION_CLIP_TO_CONTENT,
+    VISION_IMAGE_FORMAT,
+    VISION_JPEG_QUALITY,
+))
+
+def _generate_with_retry(model, content_parts):
+    """
+    Call generate_content, backing off exponentially on 429/5xx errors.
+    Sleeps are jittered so concurrent requests that hit the quota together
+    don't all retry at the same moment.
+    """
+    delay = 1.0
+    for attempt in range(VISION_MAX_RETRIES + 1):
+        if _gemini_limiter:
+            _gemini_limiter.acquire()
         try:
-            content_parts = [investment_prompt]
-            for img in investment_images:
-                content_parts.append({
-                    "mime_type": "image/png",
-                    "data": base64.b64encode(img["image_data"]).decode('utf-8')
-                })
-            
-            response = model.generate_content(content_parts)
-            markdown_content += response.text
+            return model.generate_content(content_parts)
         except Exception as e:
-            print(f"Error extracting investment details: {e}")
+            if attempt == VISION_MAX_RETRIES or not _is_retryable(e):
+                raise
+            sleep_for = min(delay, VISION_MAX_RETRY_DELAY) * random.uniform(0.5, 1.5)
+            print(f"Gemini call failed ({e}), retrying in {sleep_for:.1f}s...")
+            time.sleep(sleep_for)
+            delay *= 2
+
+def vision_call(model, prompt: str, images: list) -> str:
+    """Send one prompt plus its page images to Gemini Vision and return the text"""
+    key = None
+    if _vision_cache:
+        key = vision_key(model.model_name, prompt, [img["image_data"] for img in images])
+        cached = _vision_cache.get(key)
+        if cached is not None:
+            print(f"Vision cache hit ({key[:12]})")
+            return cached["text"]
+
+    # Raw bytes go straight into the request's Blob; no base64 round trip needed.
+    # Only oversized requests (high dpi, many pages) upload their images first.
+    uploaded = []
+    content_parts = [prompt]
+    if sum(len(img["image_data"]) for img in images) > VISION_INLINE_MAX_BYTES:
+        for img in images:
+            uploaded.append(genai.upload_file(io.BytesIO(img["image_data"]), mime_type=img.get("mime_type", "image/png")))
+        content_parts.extend(uploaded)
+    else:
+        for img in images:
+            content_parts.append({"mime_type": img.get("mime_type", "image/png"), "data": img["image_data"]})
+
+    try:
+        response = _generate_with_retry(model, content_parts)
+        text = response.text
+    finally:
+        for f in uploaded:
+            try:
+                genai.delete_file(f.name)
+            except Exception as e:
+                print(f"Could not delete uploaded page image {f.name}: {e}")
+    if _vision_cache and text:
+        _vision_cache.put(key, {"text": text, "ts": datetime.datetime.now(datetime.timezone.utc).isoformat()})
+    return text
+
+def vision_to_markdown(model, images: list) -> str:
+    """Use Gemini Vision to convert PDF pages to structured markdown"""
     
-    return markdown_content
+    # Separate fund info and investment pages
+    fund_info_images = [img for img in images if img.get("page_type") == "fund_info"]
+    investment_images = [img for img in images if img.get("page_type") == "investments"]
     
-    try:
-        # Prepare the content parts
-        content_parts = [prompt]
-        
-        for img in images:
-            content_parts.append({
-                "mime_type": "image/png",
-                "data": base64.b64encode(img["image_data"]).decode('utf-8')
-            })
-        
-        response = model.generate_content(content_parts)
-        return response.text
-    except Exception as e:
-        print(f"Error calling Gemini Vision API: {e}")
-        return None
+    # The fund info and investment calls are independent, so issue them concurrently
+    tasks = []
+    if fund_info_images:
+        tasks.append(("fund info", FUND_INFO_PROMPT, fund_info_images))
+    if investment_images:
+        tasks.append(("investment details", INVESTMENT_PROMPT, investment_images))
+    if not tasks:
+        return ""
+    if VISION_SINGLE_REQUEST and len(tasks) == 2:
+        tasks = [("fund info and investment details", COMBINED_PROMPT, fund_info_images + investment_images)]
 
-def load_prompt(path: str) -> str:
+    parts = [""] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max(1, min(VISION_CONCURRENCY, len(tasks)))) as ex:
+        futures = {
+            ex.submit(vision_call, model, prompt, task_images): i
+            for i, (_, prompt, task_images) in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                parts[i] = future.result()
+            except Exception as e:
+                print(f"Error extracting {tasks[i][0]}: {e}")
+
+    # Concatenate in page order (fund info first, then investments)
+    markdown_content = "\n\n".join(part for part in parts if part)
+    return markdown_content
+
+def embed_text(text: str, max_chars: int = 8000) -> list:
+    """
+    Embed the start of a document for near-duplicate detection.
+    Requires genai to be configured (see setup_gemini).
+    """
+    if _gemini_limiter:
+        _gemini_limiter.acquire()
+    response = genai.embed_content(
+        model=EMBEDDING_MODEL_ID,
+        content=text[:max_chars],
+        task_type="semantic_similarity",
+    )
+    return response["embedding"]
+
+@functools.lru_cache(maxsize=8)
+def _load_prompt_cached(path: str, mtime_ns: int) -> str:
     return Path(path).read_text()
 
-def load_examples(path: str):
+def load_prompt(path: str) -> str:
+    # Keyed on mtime so edits to the prompt file are picked up without a restart
+    return _load_prompt_cached(path, os.stat(path).st_mtime_ns)
+
+def _iter_jsonl(path: str):
+    """Yield parsed rows of a JSONL file, reading one line at a time"""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+@functools.lru_cache(maxsize=8)
+def _load_examples_cached(path: str, mtime_ns: int):
     """
     Load examples.jsonl and convert to LangExtract example objects.
+    Attribute keys are sorted as a defensive canonicalization. The JSON already
+    loads in a stable (file) order; sorting just keeps the provider-cacheable
+    prompt prefix unchanged if examples.jsonl is rewritten with keys reordered.
     """
+    import langextract as lx
+
     examples = []
-    for line in Path(path).read_text().splitlines():
-        row = json.loads(line)
+    for row in _iter_jsonl(path):
         # Build extractions list
         exts = []
         for e in row.get("extractions", []):
+            attributes = e.get("attributes", {})
             exts.append(
                 lx.data.Extraction(
                     extraction_class=e.get("extraction_class", "value"),
                     extraction_text=e.get("extraction_text", ""),
-                    attributes=e.get("attributes", {}),
+                    attributes={k: attributes[k] for k in sorted(attributes)},
                 )
             )
         examples.append(
@@ -191,20 +524,83 @@ def load_examples(path: str):
                 extractions=exts
             )
         )
-    return examples
+    return tuple(examples)
+
+def load_examples(path: str):
+    """
+    Parsed examples are cached per (path, mtime) and returned as a shared,
+    immutable tuple - callers must not mutate the example objects.
+    """
+    return _load_examples_cached(path, os.stat(path).st_mtime_ns)
+
+# (examples, max_workers, language model) for the most recent settings - see _langextract_model
+_lx_model = None
+_lx_model_lock = threading.Lock()
+
+def _langextract_model(examples, max_workers: int):
+    """
+    LangExtract language model for these examples, built once and reused for
+    every document (the server processes many with the same examples).
+    Building it creates the Gemini client and derives the output schema from
+    the examples; load_examples returns the same tuple until the file changes.
+    The Gemini provider runs up to its own max_workers requests at once, so a
+    different max_workers needs a new model.
+    """
+    global _lx_model
+    import langextract as lx
+
+    with _lx_model_lock:
+        if _lx_model is None or _lx_model[0] is not examples or _lx_model[1] != max_workers:
+            config = lx.factory.ModelConfig(
+                model_id=LANGEXTRACT_MODEL_ID,
+                provider_kwargs={
+                    "format_type": lx.data.FormatType.JSON,
+                    "max_workers": max_workers,
+                    "max_retries": LANGEXTRACT_MAX_RETRIES,
+                    "max_retry_delay": VISION_MAX_RETRY_DELAY,
+                },
+            )
+            model = lx.factory.create_model(config=config, examples=examples, use_schema_constraints=True)
+            _lx_model = (examples, max_workers, model)
+        return _lx_model[2]
 
-def run_langextract(clean_text: str, prompt_desc: str, examples):
+def _char_buffer_for(text_len: int) -> int:
     """
-    Core extraction call using LangExtract on the vision-generated markdown
+    LangExtract chunk size for a text of this length: 1000-char chunks (best
+    recall) for short texts, larger ones for long documents, where requests
+    (chunks x passes) would otherwise dominate the run time.
     """
+    if text_len < 20_000:
+        return 1000
+    return 2000 if text_len < 100_000 else 4000
+
+def run_langextract(clean_text: str, prompt_desc: str, examples, *,
+                    extraction_passes: int = None, max_workers: int = None, max_char_buffer: int = None):
+    """
+    Core extraction call using LangExtract on the vision-generated markdown.
+    LangExtract renders the prompt description and examples ahead of each
+    document chunk, so the static part is a stable prefix and the document
+    text is strictly the suffix - Gemini 2.5 caches that prefix implicitly.
+    Keep prompt_desc/examples deterministic (see load_examples) to benefit.
+    extraction_passes, max_workers and max_char_buffer default to the
+    LANGEXTRACT_* settings.
+    """
+    import langextract as lx
+
+    extraction_passes = extraction_passes or LANGEXTRACT_EXTRACTION_PASSES
+    max_workers = max_workers or LANGEXTRACT_MAX_WORKERS
+    max_char_buffer = max_char_buffer or LANGEXTRACT_CHAR_BUFFER or _char_buffer_for(len(clean_text))
     result = lx.extract(
         text_or_documents=clean_text,
         prompt_description=prompt_desc,
         examples=examples,
-        model_id="gemini-2.5-pro",  # Use the same model for consistency
-        extraction_passes=3,     # improves recall on long docs
-        max_workers=8,           # parallel requests
-        max_char_buffer=1000     # controls chunk size
+        model=_langextract_model(examples, max_workers),  # already carries the example-derived schema
+        use_schema_constraints=False,
+        extraction_passes=extraction_passes,  # improves recall on long docs
+        max_workers=max_workers,  # parallel requests
+        # chunks per batch; parallelism is min(batch_length, max_workers)
+        batch_length=max(max_workers, 10),
+        max_char_buffer=max_char_buffer,  # controls chunk size
     )
     return result
 
@@ -213,21 +609,29 @@ def ensure_run_dir(base: str = "outputs") -> Path:
     base_path.mkdir(parents=True, exist_ok=True)
     stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     run_dir = base_path / f"run_{stamp}"
-    run_dir.mkdir(parents=True, exist_ok=True)
-    return run_dir
+    # Runs started within the same second (concurrent jobs) get a numeric suffix
+    suffix = 1
+    while True:
+        try:
+            run_dir.mkdir()
+            return run_dir
+        except FileExistsError:
+            run_dir = base_path / f"run_{stamp}_{suffix}"
+            suffix += 1
 
 def save_outputs(result, run_dir: Path):
     """
     Save annotated JSONL (entities + spans) then create the HTML visualization.
+    run_dir must already exist (see ensure_run_dir).
     """
-    run_dir.mkdir(parents=True, exist_ok=True)
+    import langextract as lx
 
     # Normalize result to a list of documents expected by langextract IO
-    if isinstance(result, (list, tuple)):
-        docs = list(result)
-        # Some APIs return (result, meta)
-        if len(docs) == 2 and hasattr(docs[0], "extractions") and not hasattr(docs[1], "extractions"):
-            docs = [docs[0]]
+    if isinstance(result, lx.data.AnnotatedDocument):
+        docs = [result]  # the usual case: lx.extract on a single text
+    elif isinstance(result, (list, tuple)):
+        # A list of documents, or (document, metadata) from some API versions
+        docs = [doc for doc in result if isinstance(doc, lx.data.AnnotatedDocument)]
     else:
         docs = [result]
 
@@ -240,11 +644,37 @@ def save_outputs(result, run_dir: Path):
         return
 
     try:
-        html = lx.visualize(str(run_dir / "extraction.jsonl"))
-        (run_dir / "review.html").write_text(html, encoding="utf-8")
+        # Visualize the in-memory document (the same first document the JSONL
+        # path would load) rather than re-reading and re-parsing the file
+        html = lx.visualize(docs[0])
+        # One encode straight to bytes, skipping the text-file layer
+        (run_dir / "review.html").write_bytes(html.encode("utf-8"))
     except Exception as e:
         (run_dir / "visualize_error.txt").write_text(f"visualize failed: {e}\n", encoding="utf-8")
 
+class _NumericCharsTable(dict):
+    """
+    str.translate table that keeps only ASCII digits, "." and "-" - the same
+    characters re.sub(r"[^0-9.\-]", "", s) keeps. Entries are filled in on
+    first sight of each code point, so it covers all of Unicode.
+    """
+    def __missing__(self, codepoint):
+        keep = codepoint if chr(codepoint) in "0123456789.-" else None
+        self[codepoint] = keep
+        return keep
+
+_NUMERIC_CHARS = _NumericCharsTable()
+_YEAR_RE = re.compile(r"\d{4}")  # vintage_year: the first four-digit run
+
+# extraction_class -> destination, for the classes copied over as plain values
+_FUND_TEXT_FIELDS = frozenset({"fund_name", "fund_reporting_period", "domicile", "strategy", "gp_name"})
+_FEE_FIELDS = frozenset({"management_fee", "carry", "hurdle_rate", "catch_up"})
+_INVESTMENT_TEXT_FIELDS = frozenset({"industry", "country", "currency", "investment_date"})
+_INVESTMENT_NUMERIC_FIELDS = frozenset({"investment_cost", "fair_value", "ownership", "number_of_shares", "moic"})
+
+# Read-only stand-in for extractions without attributes (no dict built per extraction)
+_NO_ATTRIBUTES = MappingProxyType({})
+
 def normalize_to_schema(result, run_dir: Path):
     """
     Convert LangExtract's result into our Pydantic schema.
@@ -261,131 +691,69 @@ def normalize_to_schema(result, run_dir: Path):
     }
 
     # Group investment extractions by investment name AND type
-    investment_groups = {}
+    # (name, type) -> index into groups; a group dict is only built on first sight
+    group_ids = {}
+    groups = []
     current_investment_name = None
     current_investment_type = None
+    # Group of the current (name, type); reset whenever either changes
+    current_group = None
+
+    def group_for(key, name, inv_type=None):
+        gid = group_ids.get(key)
+        if gid is None:
+            gid = group_ids[key] = len(groups)
+            groups.append({"investment_name": name} if inv_type is None
+                          else {"investment_name": name, "investment_type": inv_type})
+        return groups[gid]
 
+    # Bind the output containers once rather than subscripting data per extraction
+    fund, fees, contacts, source_anchors = data["fund"], data["fees"], data["contacts"], data["source_anchors"]
+
+    # Extractions are lx.data.Extraction dataclasses, so read the fields directly
     for ext in extractions:
-        cls = getattr(ext, "extraction_class", "")
-        txt = getattr(ext, "extraction_text", "")
-        attrs = getattr(ext, "attributes", {}) or {}
-
-        # Fund-level fields
-        if cls == "fund_name":
-            data["fund"]["fund_name"] = txt
-        elif cls == "fund_reporting_period":
-            data["fund"]["fund_reporting_period"] = txt
+        cls = ext.extraction_class
+        txt = ext.extraction_text
+        attrs = ext.attributes or _NO_ATTRIBUTES
+
+        if cls in _FUND_TEXT_FIELDS:
+            fund[cls] = txt
         elif cls == "vintage_year":
-            try:
-                data["fund"]["vintage_year"] = int(re.sub(r"\D", "", txt))
-            except Exception:
-                data["fund"]["vintage_year"] = None
-        elif cls == "domicile":
-            data["fund"]["domicile"] = txt
-        elif cls == "strategy":
-            data["fund"]["strategy"] = txt
-        elif cls == "gp_name":
-            data["fund"]["gp_name"] = txt
-
-        # Fee fields
-        elif cls == "management_fee":
-            data["fees"]["management_fee"] = txt
-        elif cls == "carry":
-            data["fees"]["carry"] = txt
-        elif cls == "hurdle_rate":
-            data["fees"]["hurdle_rate"] = txt
-        elif cls == "catch_up":
-            data["fees"]["catch_up"] = txt
+            # "2019", "Vintage 2019" and "2019-03-31" all mean 2019
+            year = _YEAR_RE.search(txt) if txt else None
+            fund["vintage_year"] = int(year.group()) if year else None
+        elif cls in _FEE_FIELDS:
+            fees[cls] = txt
 
         # Investment fields - group by investment name AND type
         elif cls == "investment_name":
             current_investment_name = txt
-            if current_investment_type:
-                unique_key = f"{txt}_{current_investment_type}"
-            else:
-                unique_key = txt
-            if unique_key not in investment_groups:
-                investment_groups[unique_key] = {"investment_name": txt}
+            current_group = None
+            # Until a type has been seen the group is keyed on the name alone
+            group_for((txt, current_investment_type or None), txt)
         elif cls == "investment_type":
             current_investment_type = txt
+            current_group = None
             if current_investment_name:
-                unique_key = f"{current_investment_name}_{txt}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name}
-                investment_groups[unique_key]["investment_type"] = txt
-        elif cls == "industry":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["industry"] = txt
-        elif cls == "country":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["country"] = txt
-        elif cls == "currency":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["currency"] = txt
-        elif cls == "investment_date":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                investment_groups[unique_key]["investment_date"] = txt
-        elif cls == "investment_cost":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["investment_cost"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["investment_cost"] = None
-        elif cls == "fair_value":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["fair_value"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["fair_value"] = None
-        elif cls == "ownership":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    pct = re.sub(r"[^0-9.\-]", "", txt)
-                    investment_groups[unique_key]["ownership"] = float(pct)
-                except Exception:
-                    investment_groups[unique_key]["ownership"] = None
-        elif cls == "number_of_shares":
-            if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["number_of_shares"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["number_of_shares"] = None
-        elif cls == "moic":
+                group_for((current_investment_name, txt), current_investment_name)["investment_type"] = txt
+        elif cls in _INVESTMENT_TEXT_FIELDS or cls in _INVESTMENT_NUMERIC_FIELDS:
             if current_investment_name and current_investment_type:
-                unique_key = f"{current_investment_name}_{current_investment_type}"
-                if unique_key not in investment_groups:
-                    investment_groups[unique_key] = {"investment_name": current_investment_name, "investment_type": current_investment_type}
-                try:
-                    investment_groups[unique_key]["moic"] = float(re.sub(r"[^0-9.\-]", "", txt))
-                except Exception:
-                    investment_groups[unique_key]["moic"] = None
+                if current_group is None:
+                    current_group = group_for(
+                        (current_investment_name, current_investment_type),
+                        current_investment_name,
+                        current_investment_type,
+                    )
+                if cls in _INVESTMENT_NUMERIC_FIELDS:
+                    try:
+                        current_group[cls] = float(txt.translate(_NUMERIC_CHARS))
+                    except (ValueError, AttributeError):  # unparsable / missing text
+                        current_group[cls] = None
+                else:
+                    current_group[cls] = txt
 
         elif cls == "contact":
-            data["contacts"].append({
+            contacts.append({
                 "name": txt,
                 "title": attrs.get("title"),
                 "email": attrs.get("email"),
@@ -394,11 +762,11 @@ def normalize_to_schema(result, run_dir: Path):
 
         # collect any anchors if present in attributes
         if "anchor" in attrs:
-            data["source_anchors"].append(attrs["anchor"])
+            source_anchors.append(attrs["anchor"])
 
     # Convert investment groups to list and clean up
     investments = []
-    for inv in investment_groups.values():
+    for inv in groups:
         # Skip investments that have no financial data (investment_cost, fair_value, or ownership)
         if (inv.get("investment_cost") is not None or 
             inv.get("fair_value") is not None or 
@@ -415,10 +783,11 @@ def normalize_to_schema(result, run_dir: Path):
     
     data["investments"] = investments
 
-    # Create the schema object
-    model = FundDocExtraction(**data)
+    # Create the schema object in one validation pass. pydantic-core builds the
+    # nested models in Rust, 3-4x faster than model_construct's per-field Python
+    model = FundDocExtraction.model_validate(data)
     
     # Save the normalized data
-    (run_dir / "normalized.json").write_text(model.model_dump_json(indent=2), encoding="utf-8")
+    (run_dir / "normalized.json").write_bytes(orjson.dumps(model.model_dump(mode="json"), option=orjson.OPT_INDENT_2))
     
     return model
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Shared orchestration for the vision pipeline: PDF -> Vision markdown -> LangExtract -> schema -> exports
+Used by both the CLI (api/app.py) and the API server, which differ only in how they report progress
+"""
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+import orjson
+from pydantic import ValidationError
+
+from pipeline import (
+    setup_gemini,
+    extract_pdf_pages_as_images,
+    vision_to_markdown,
+    load_prompt,
+    load_examples,
+    run_langextract,
+    save_outputs,
+    normalize_to_schema,
+    embed_text,
+    LANGEXTRACT_MODEL_ID,
+    VISION_SETTINGS,
+)
+from cache import ExtractionCache, SemanticCache, extraction_key, markdown_key, file_sha256
+from schema import FundDocExtraction
+
+DEFAULT_PAGE_RANGES = [(0, 0), (6, 7)]  # first page + investment pages
+
+ProgressCallback = Callable[[int, str], None]
+
+def _print_progress(progress: int, message: str) -> None:
+    print(message)
+
+def _load_cached_model(payload: dict, run_dir: Path) -> Optional[FundDocExtraction]:
+    """Revalidate a cached payload; None if it no longer matches the schema"""
+    try:
+        model = FundDocExtraction.model_validate(payload)
+    except ValidationError:
+        return None
+    (run_dir / "normalized.json").write_bytes(orjson.dumps(model.model_dump(mode="json"), option=orjson.OPT_INDENT_2))
+    return model
+
+def run_document(
+    pdf_path: str,
+    run_dir: Path,
+    prompt_path: str = "prompts/fund_terms.md",
+    examples_path: str = "prompts/examples.jsonl",
+    page_ranges=DEFAULT_PAGE_RANGES,
+    dpi: int = 150,
+    cache: Optional[ExtractionCache] = None,
+    semantic_cache: Optional[SemanticCache] = None,
+    export: bool = True,
+    progress: ProgressCallback = _print_progress,
+    offload_render: bool = False,
+) -> FundDocExtraction:
+    """
+    Run the full pipeline for one PDF, writing all artifacts into run_dir.
+    progress(percent, message) is called as each step starts.
+    offload_render rasterizes pages in a worker process even for a few pages
+    (for callers running this in a thread next to an event loop).
+    """
+    # 0) Check the extraction cache - a hit skips both Vision and LangExtract
+    cache_key = None
+    markdown_cache_key = None
+    model = None
+    if cache:
+        prompt_text = load_prompt(prompt_path)
+        examples_bytes = Path(examples_path).read_bytes()
+        cache_key = extraction_key(
+            file_sha256(pdf_path),
+            prompt_text,
+            examples_bytes,
+            LANGEXTRACT_MODEL_ID,
+            extra=repr((page_ranges, dpi, VISION_SETTINGS)),
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            model = _load_cached_model(cached, run_dir)
+            if model is not None:
+                print(f"Cache hit ({cache_key[:12]}), skipping Vision and LangExtract")
+            else:
+                print("Cached extraction no longer matches the schema, re-running")
+                cache.evict(cache_key)
+
+    embedding = None
+    if model is None:
+        # 1) PDF Pages -> Images -> Markdown via Gemini Vision
+        progress(20, "Converting PDF pages to markdown...")
+        print(f"Extracting pages: {page_ranges}")
+        gemini = setup_gemini()
+        images = extract_pdf_pages_as_images(pdf_path, page_ranges, dpi=dpi, offload=offload_render)
+        markdown_content = vision_to_markdown(gemini, images)
+
+        if not markdown_content:
+            raise RuntimeError("Failed to convert PDF pages to markdown")
+
+        (run_dir / "vision_markdown.md").write_text(markdown_content, encoding="utf-8")
+        print(f"Vision markdown saved: {run_dir/'vision_markdown.md'} ({len(markdown_content)} characters)")
+
+        # Same markdown as a document we've already extracted (e.g. a re-saved PDF
+        # whose pages rendered identically)? Then LangExtract would get the same input
+        if cache:
+            markdown_cache_key = markdown_key(markdown_content, prompt_text, examples_bytes, LANGEXTRACT_MODEL_ID)
+            cached = cache.get(markdown_cache_key)
+            if cached is not None:
+                model = _load_cached_model(cached, run_dir)
+                if model is not None:
+                    print(f"Markdown cache hit ({markdown_cache_key[:12]}), skipping LangExtract")
+                    cache.put(cache_key, cached)  # this PDF's next run skips Vision as well
+                else:
+                    cache.evict(markdown_cache_key)
+
+        # Near-duplicate of a document we've already extracted? (opt-in)
+        if semantic_cache and model is None:
+            embedding = embed_text(markdown_content)
+            hit = semantic_cache.lookup(embedding)
+            if hit is not None:
+                semantic_key, cached = hit
+                model = _load_cached_model(cached, run_dir)
+                if model is not None:
+                    if cache:
+                        cache.put(cache_key, cached)  # this PDF's next run skips Vision and the embedding
+                else:
+                    # Stale entry: drop it so the fresh extraction below replaces it
+                    semantic_cache.evict(semantic_key)
+
+    if model is None:
+        # 2) Load prompt & examples
+        progress(40, "Loading extraction prompts and examples...")
+        prompt = load_prompt(prompt_path)
+        examples = load_examples(examples_path)
+
+        # 3) LangExtract on vision-generated markdown
+        progress(60, "Running LangExtract on vision-generated markdown...")
+        if not os.getenv("LANGEXTRACT_API_KEY") and os.getenv("GOOGLE_API_KEY"):
+            os.environ["LANGEXTRACT_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+        if not os.getenv("LANGEXTRACT_API_KEY"):
+            raise RuntimeError("No API key found. Please set LANGEXTRACT_API_KEY or GOOGLE_API_KEY")
+
+        result = run_langextract(markdown_content, prompt, examples)
+        if not result:
+            raise RuntimeError("LangExtract returned no result")
+
+        # 4) Save artifacts (JSONL + HTML viz)
+        progress(80, "Saving extraction artifacts...")
+        save_outputs(result, run_dir)
+
+        # 5) Normalize to schema
+        progress(90, "Normalizing to schema...")
+        model = normalize_to_schema(result, run_dir)
+
+        if cache:
+            payload = model.model_dump()
+            cache.put(cache_key, payload)
+            cache.put(markdown_cache_key, payload)
+        if semantic_cache:
+            semantic_cache.add(embedding, model.model_dump())
+
+    if export:
+        # 6) Export to CSV and PDF - pandas/reportlab are only imported when exporting
+        progress(95, "Exporting to CSV and PDF...")
+        from exporter import to_relational_rows, write_csvs, write_pdf_report
+
+        fund_id = run_dir.name  # simple, unique per run; good as our PK
+        tables = to_relational_rows(model, fund_id=fund_id)
+        write_csvs(tables, run_dir / "csv")
+        write_pdf_report(model, run_dir / "report.pdf", fund_id=fund_id)
+
+    return model
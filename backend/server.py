@@ -7,14 +7,18 @@ import os
 import uuid
 import hashlib
 import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
 from pathlib import Path
 from typing import Dict, Any, Optional
 from datetime import datetime
-import json
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+import orjson
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from pydantic import BaseModel
 import aiofiles
 from dotenv import load_dotenv
@@ -22,17 +26,22 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from pipeline import (
-    setup_gemini,
-    extract_pdf_pages_as_images,
-    vision_to_markdown,
-    load_prompt,
-    load_examples,
-    run_langextract,
-    ensure_run_dir,
-    save_outputs,
-    normalize_to_schema,
-)
+from pipeline import ensure_run_dir
+from runner import run_document
+from store import ResultsStore
+
+# Server log records are queued and written to stderr by a listener thread, so
+# coroutines on the event loop never block on the write
+logger = logging.getLogger("server")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_stderr_handler = logging.StreamHandler()
+_stderr_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _stderr_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # flush queued records on shutdown
 
 # Initialize FastAPI app
 app = FastAPI(title="Document Processing API", version="1.0.0")
@@ -48,83 +57,59 @@ app.add_middleware(
 
 # In-memory job storage (in production, use Redis or database)
 jobs: Dict[str, Dict[str, Any]] = {}
-results: Dict[str, Dict[str, Any]] = {}
-
-def load_existing_results():
-    """Load existing processed results from output directories"""
-    outputs_dir = Path("outputs")
-    if not outputs_dir.exists():
-        return
-    
-    for run_dir in outputs_dir.iterdir():
-        if not run_dir.is_dir() or not run_dir.name.startswith("run_"):
-            continue
-            
-        normalized_path = run_dir / "normalized.json"
-        if not normalized_path.exists():
-            continue
-            
-        try:
-            with open(normalized_path, 'r') as f:
-                normalized_data = json.load(f)
-            
-            # Try to find the original file to get hash
-            uploads_dir = Path("uploads")
-            if uploads_dir.exists():
-                for upload_file in uploads_dir.iterdir():
-                    if upload_file.is_file():
-                        # Read file content to compute hash
-                        with open(upload_file, 'rb') as f:
-                            file_content = f.read()
-                        file_hash = compute_file_hash(file_content)
-                        
-                        # Create result entry
-                        downloads = {
-                            "csv": f"/api/download/{file_hash}/investments.csv",
-                            "json": f"/api/download/{file_hash}/normalized.json", 
-                            "pdf": f"/api/download/{file_hash}/report.pdf",
-                        }
-                        
-                        investments = normalized_data.get("investments", [])
-                        preview = {
-                            "fund": {
-                                "name": normalized_data.get("fund", {}).get("fund_name", "Unknown"),
-                                "reporting_period": normalized_data.get("fund", {}).get("fund_reporting_period", "Not specified"),
-                            },
-                            "soi": [
-                                {
-                                    "name": inv.get("investment_name", ""),
-                                    "type": inv.get("investment_type", ""),
-                                    "industry": inv.get("industry", ""),
-                                    "country": inv.get("country", ""),
-                                    "cost": inv.get("investment_cost", 0),
-                                    "fair_value": inv.get("fair_value", 0),
-                                    "ownership": inv.get("ownership", None),
-                                }
-                                for inv in investments
-                            ],
-                            "summary": {
-                                "total_investments": len(investments),
-                                "total_cost": sum(inv.get("investment_cost", 0) or 0 for inv in investments),
-                                "total_fair_value": sum(inv.get("fair_value", 0) or 0 for inv in investments),
-                            }
-                        }
-                        
-                        results[file_hash] = {
-                            "hash": file_hash,
-                            "filename": upload_file.name,
-                            "doc_type": "fund_financials",
-                            "entities": normalized_data,
-                            "downloads": downloads,
-                            "preview": preview,
-                            "completedAt": datetime.now().isoformat(),
-                            "run_dir": str(run_dir.absolute()),
-                        }
-                        print(f"✅ Loaded existing result: {upload_file.name}")
-                        break
-                        
-        except Exception as e:
-            print(f"Error loading result from {run_dir}: {e}")
+# Documents processed at once; each one already fans out to Gemini in parallel
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+_job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+# Uploads are streamed to disk in chunks of this size rather than read whole
+UPLOAD_CHUNK_SIZE = 1 << 20
+# Completed results persist in SQLite so they survive restarts and can be
+# added by other processes (see add_result.py)
+results = ResultsStore()
+
+def build_downloads(file_hash: str) -> dict:
+    """Download URLs for a processed document's exports"""
+    return {
+        "csv": f"/api/download/{file_hash}/investments.csv",
+        "json": f"/api/download/{file_hash}/normalized.json",
+        "pdf": f"/api/download/{file_hash}/report.pdf",
+    }
+
+def build_preview(fund, investments) -> dict:
+    """
+    Preview payload (fund header, SOI rows, totals).
+    Takes either normalized.json dicts or the schema models.
+    """
+    get = dict.get if isinstance(fund, dict) else getattr
+    soi = []
+    total_cost = 0
+    total_fair_value = 0
+    # One pass builds the rows and both totals
+    for inv in investments:
+        cost = get(inv, "investment_cost", 0)
+        fair_value = get(inv, "fair_value", 0)
+        soi.append({
+            "name": get(inv, "investment_name", ""),
+            "type": get(inv, "investment_type", ""),
+            "industry": get(inv, "industry", ""),
+            "country": get(inv, "country", ""),
+            "cost": cost,
+            "fair_value": fair_value,
+            "ownership": get(inv, "ownership", None),
+        })
+        total_cost += cost or 0
+        total_fair_value += fair_value or 0
+    return {
+        "fund": {
+            "name": get(fund, "fund_name", "Unknown"),
+            "reporting_period": get(fund, "fund_reporting_period", "Not specified"),
+        },
+        "soi": soi,
+        "summary": {
+            "total_investments": len(soi),
+            "total_cost": total_cost,
+            "total_fair_value": total_fair_value,
+        }
+    }
 
 # Pydantic models
 class JobStatus(BaseModel):
@@ -147,10 +132,6 @@ class ProcessingResult(BaseModel):
     preview: Optional[Dict[str, Any]] = None
     completedAt: str
 
-def compute_file_hash(file_content: bytes) -> str:
-    """Compute SHA256 hash of file content"""
-    return hashlib.sha256(file_content).hexdigest()
-
 def infer_doc_type(filename: str) -> str:
     """Infer document type from filename"""
     name = filename.lower()
@@ -160,10 +141,6 @@ def infer_doc_type(filename: str) -> str:
         return "investor_report"
     return "generic"
 
-# Load existing results on startup (after function definitions)
-# Disabled for demo - each unique document will be processed fresh
-# load_existing_results()
-
 async def process_document_async(job_id: str, file_path: Path, filename: str, file_hash: str):
     """Background task to process document"""
     try:
@@ -175,102 +152,32 @@ async def process_document_async(job_id: str, file_path: Path, filename: str, fi
         # Create output directory
         run_dir = ensure_run_dir()
         jobs[job_id]["run_dir"] = str(run_dir)
-        jobs[job_id]["progress"] = 20
-        jobs[job_id]["message"] = "Converting PDF pages to markdown..."
-
-        # Step 1: PDF Pages -> Images -> Markdown via Gemini Vision
-        model = setup_gemini()
-        images = extract_pdf_pages_as_images(str(file_path), page_ranges=[(0, 0), (6, 7)])
-        markdown_content = vision_to_markdown(model, images)
-        
-        if not markdown_content:
-            raise Exception("Failed to convert PDF pages to markdown")
-        
-        # Save vision-generated markdown
-        vision_markdown_path = run_dir / "vision_markdown.md"
-        async with aiofiles.open(vision_markdown_path, 'w', encoding='utf-8') as f:
-            await f.write(markdown_content)
-        
-        jobs[job_id]["progress"] = 40
-        jobs[job_id]["message"] = "Loading extraction prompts and examples..."
-
-        # Step 2: Load prompt & examples
-        prompt = load_prompt("docs/prompts/fund_terms.md")
-        examples = load_examples("docs/prompts/examples.jsonl")
-
-        jobs[job_id]["progress"] = 60
-        jobs[job_id]["message"] = "Running LangExtract on vision-generated markdown..."
-
-        # Step 3: LangExtract on vision-generated markdown
-        if not os.getenv("LANGEXTRACT_API_KEY") and os.getenv("GOOGLE_API_KEY"):
-            os.environ["LANGEXTRACT_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-        
-        # Check API keys
-        api_key = os.getenv("LANGEXTRACT_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise Exception("No API key found. Please set LANGEXTRACT_API_KEY or GOOGLE_API_KEY")
-        
-        print(f"Running LangExtract with API key: {api_key[:10]}...")
-        result = run_langextract(markdown_content, prompt, examples)
-        
-        if not result:
-            raise Exception("LangExtract returned no result")
-
-        jobs[job_id]["progress"] = 80
-        jobs[job_id]["message"] = "Saving extraction artifacts..."
-
-        # Step 4: Save artifacts (JSONL + HTML viz)
-        save_outputs(result, run_dir)
-
-        jobs[job_id]["progress"] = 90
-        jobs[job_id]["message"] = "Normalizing to schema..."
 
-        # Step 5: Normalize to schema
-        model_data = normalize_to_schema(result, run_dir)
-
-        jobs[job_id]["progress"] = 95
-        jobs[job_id]["message"] = "Preparing exports..."
-
-        # Step 6: Export to CSV and PDF
-        from exporter import to_relational_rows, write_csvs, write_pdf_report
-        
-        fund_id = run_dir.name
-        tables = to_relational_rows(model_data, fund_id=fund_id)
-        csv_dir = run_dir / "csv"
-        write_csvs(tables, csv_dir)
-        write_pdf_report(model_data, run_dir / "report.pdf", fund_id=fund_id)
+        def report_progress(progress: int, message: str):
+            jobs[job_id]["progress"] = progress
+            jobs[job_id]["message"] = message
+
+        # Steps 1-6: Vision markdown -> LangExtract -> schema -> CSV/PDF exports.
+        # The pipeline blocks, so it runs in a worker thread: the event loop keeps
+        # answering status polls and queued uploads are processed side by side.
+        # Page rendering holds the GIL, so it goes to the render worker processes
+        jobs[job_id]["message"] = "Waiting for a processing slot..."
+        async with _job_slots:
+            model_data = await asyncio.to_thread(
+                run_document,
+                str(file_path),
+                run_dir,
+                prompt_path="docs/prompts/fund_terms.md",
+                examples_path="docs/prompts/examples.jsonl",
+                progress=report_progress,
+                offload_render=True,
+            )
 
         # Prepare downloads
-        downloads = {
-            "csv": f"/api/download/{file_hash}/investments.csv",
-            "json": f"/api/download/{file_hash}/normalized.json",
-            "pdf": f"/api/download/{file_hash}/report.pdf",
-        }
+        downloads = build_downloads(file_hash)
 
         # Create preview data
-        preview = {
-            "fund": {
-                "name": model_data.fund.fund_name,
-                "reporting_period": model_data.fund.fund_reporting_period,
-            },
-            "soi": [
-                {
-                    "name": inv.investment_name,
-                    "type": inv.investment_type,
-                    "industry": inv.industry,
-                    "country": inv.country,
-                    "cost": inv.investment_cost,
-                    "fair_value": inv.fair_value,
-                    "ownership": inv.ownership,
-                }
-                for inv in model_data.investments
-            ],
-            "summary": {
-                "total_investments": len(model_data.investments),
-                "total_cost": sum(inv.investment_cost or 0 for inv in model_data.investments),
-                "total_fair_value": sum(inv.fair_value or 0 for inv in model_data.investments),
-            }
-        }
+        preview = build_preview(model_data.fund, model_data.investments)
 
         # Update job status to completed
         jobs[job_id]["state"] = "done"
@@ -280,8 +187,8 @@ async def process_document_async(job_id: str, file_path: Path, filename: str, fi
         jobs[job_id]["downloads"] = downloads
         jobs[job_id]["preview"] = preview
 
-        # Store result
-        results[file_hash] = {
+        # Store result (SQLite commit, off the event loop)
+        await asyncio.to_thread(results.put, file_hash, {
             "hash": file_hash,
             "filename": filename,
             "doc_type": jobs[job_id]["doc_type"],
@@ -290,38 +197,56 @@ async def process_document_async(job_id: str, file_path: Path, filename: str, fi
             "preview": preview,
             "completedAt": datetime.now().isoformat(),
             "run_dir": str(run_dir),
-        }
+        })
 
     except Exception as e:
         import traceback
         jobs[job_id]["state"] = "error"
         jobs[job_id]["message"] = f"Processing failed: {str(e)}"
-        print(f"Error processing job {job_id}: {e}")
-        print(f"Full traceback: {traceback.format_exc()}")
+        logger.exception("Error processing job %s: %s", job_id, e)
         
-        # Save error log to run directory
+        # Save error log to run directory (off the event loop)
         if "run_dir" in jobs[job_id]:
             error_log_path = Path(jobs[job_id]["run_dir"]) / "error.log"
-            with open(error_log_path, 'w') as f:
-                f.write(f"Error: {e}\n")
-                f.write(f"Traceback: {traceback.format_exc()}")
+            await asyncio.to_thread(
+                error_log_path.write_text,
+                f"Error: {e}\nTraceback: {traceback.format_exc()}",
+            )
 
 @app.post("/api/upload")
 async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """Upload and process a document"""
     try:
-        # Read file content
-        file_content = await file.read()
-        file_hash = compute_file_hash(file_content)
+        # Stream the upload to a temp file, hashing as we go, so the PDF is
+        # never held in memory whole
+        uploads_dir = Path("uploads")
+        uploads_dir.mkdir(exist_ok=True)
+        tmp_path = uploads_dir / f".upload-{uuid.uuid4().hex}.tmp"
+        hasher = hashlib.sha256()
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        file_hash = hasher.hexdigest()
         
         # Check if already processed
-        if file_hash in results:
+        existing = await asyncio.to_thread(results.get, file_hash)
+        if existing is not None:
+            tmp_path.unlink(missing_ok=True)
             return JSONResponse({
                 "job_id": f"cached-{file_hash}",
-                "doc_type": results[file_hash]["doc_type"],
+                "doc_type": existing["doc_type"],
                 "message": "File already processed, returning cached result"
             })
 
+        # Move the uploaded file into place under its content hash
+        file_path = uploads_dir / f"{file_hash}_{file.filename}"
+        os.replace(tmp_path, file_path)
+
         # Create job
         job_id = str(uuid.uuid4())
         doc_type = infer_doc_type(file.filename)
@@ -337,14 +262,6 @@ async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File
             "message": "Job created, starting processing..."
         }
 
-        # Save uploaded file
-        uploads_dir = Path("uploads")
-        uploads_dir.mkdir(exist_ok=True)
-        file_path = uploads_dir / f"{file_hash}_{file.filename}"
-        
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-
         # Start background processing
         background_tasks.add_task(process_document_async, job_id, file_path, file.filename, file_hash)
 
@@ -357,7 +274,7 @@ async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.get("/api/status/{job_id}")
-async def get_status(job_id: str):
+async def get_status(job_id: str) -> JobStatus:
     """Get processing status"""
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -376,12 +293,12 @@ async def get_status(job_id: str):
     )
 
 @app.get("/api/result/{file_hash}")
-async def get_result(file_hash: str):
+async def get_result(file_hash: str) -> ProcessingResult:
     """Get processing result by file hash"""
-    if file_hash not in results:
+    result = await asyncio.to_thread(results.get, file_hash)
+    if result is None:
         raise HTTPException(status_code=404, detail="Result not found")
     
-    result = results[file_hash]
     return ProcessingResult(
         hash=result["hash"],
         filename=result["filename"],
@@ -395,34 +312,48 @@ async def get_result(file_hash: str):
 @app.get("/api/history")
 async def get_history(limit: int = 5):
     """Get processing history"""
-    history_items = list(results.values())[:limit]
-    return {"items": history_items}
+    history_items = await asyncio.to_thread(lambda: list(results.values(limit)))
+    # Stored payloads are plain JSON, so encode them directly instead of walking
+    # them with FastAPI's jsonable_encoder
+    return Response(orjson.dumps({"items": history_items}), media_type="application/json")
+
+# Downloadable exports: filename -> (path within the run directory, media type)
+DOWNLOADS = {
+    "normalized.json": ("normalized.json", "application/json"),
+    "investments.csv": ("csv/investments.csv", "text/csv"),
+    "report.pdf": ("report.pdf", "application/pdf"),
+}
 
 @app.get("/api/download/{file_hash}/{filename}")
-async def download_file(file_hash: str, filename: str):
+async def download_file(file_hash: str, filename: str, request: Request):
     """Download processed files"""
-    if file_hash not in results:
+    result = await asyncio.to_thread(results.get, file_hash)
+    if result is None:
         raise HTTPException(status_code=404, detail="File not found")
     
-    result = results[file_hash]
     run_dir = Path(result["run_dir"])
     
-    if filename == "normalized.json":
-        file_path = run_dir / "normalized.json"
-    elif filename == "investments.csv":
-        file_path = run_dir / "csv" / "investments.csv"
-    elif filename == "report.pdf":
-        file_path = run_dir / "report.pdf"
-    else:
+    if filename not in DOWNLOADS:
         raise HTTPException(status_code=404, detail="File not found")
+    relative_path, media_type = DOWNLOADS[filename]
+    file_path = run_dir / relative_path
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
     
+    # A run's artifacts never change, so the file hash + run directory identify
+    # the content; clients revalidate and get an empty 304 when it's unchanged
+    etag = f'"{file_hash}-{run_dir.name}-{filename}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
     return FileResponse(
         path=file_path,
         filename=filename,
-        media_type="application/octet-stream"
+        media_type=media_type,
+        headers=headers,
     )
 
 @app.get("/")
@@ -443,44 +374,17 @@ async def add_manual_result():
         if not normalized_path.exists():
             raise HTTPException(status_code=404, detail="Normalized data not found")
         
-        with open(normalized_path, 'r') as f:
-            normalized_data = json.load(f)
+        normalized_data = orjson.loads(normalized_path.read_bytes())
         
         # Create downloads URLs
-        downloads = {
-            "csv": f"/api/download/{file_hash}/investments.csv",
-            "json": f"/api/download/{file_hash}/normalized.json", 
-            "pdf": f"/api/download/{file_hash}/report.pdf",
-        }
+        downloads = build_downloads(file_hash)
         
         # Create preview data
         investments = normalized_data.get("investments", [])
-        preview = {
-            "fund": {
-                "name": normalized_data.get("fund", {}).get("fund_name", "Unknown"),
-                "reporting_period": normalized_data.get("fund", {}).get("fund_reporting_period", "Not specified"),
-            },
-            "soi": [
-                {
-                    "name": inv.get("investment_name", ""),
-                    "type": inv.get("investment_type", ""),
-                    "industry": inv.get("industry", ""),
-                    "country": inv.get("country", ""),
-                    "cost": inv.get("investment_cost", 0),
-                    "fair_value": inv.get("fair_value", 0),
-                    "ownership": inv.get("ownership", None),
-                }
-                for inv in investments
-            ],
-            "summary": {
-                "total_investments": len(investments),
-                "total_cost": sum(inv.get("investment_cost", 0) or 0 for inv in investments),
-                "total_fair_value": sum(inv.get("fair_value", 0) or 0 for inv in investments),
-            }
-        }
+        preview = build_preview(normalized_data.get("fund", {}), investments)
         
         # Add to results
-        results[file_hash] = {
+        await asyncio.to_thread(results.put, file_hash, {
             "hash": file_hash,
             "filename": filename,
             "doc_type": "fund_financials",
@@ -489,7 +393,7 @@ async def add_manual_result():
             "preview": preview,
             "completedAt": datetime.now().isoformat(),
             "run_dir": str(run_dir.absolute()),
-        }
+        })
         
         return {"message": "Result added successfully", "investments_count": len(investments)}
         
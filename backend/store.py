@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed store for processed document results
+Shared by the API server and helper scripts (e.g. add_result.py), so results
+survive restarts and can be written from another process
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import orjson
+
+DEFAULT_DB_PATH = ".cache/results.db"
+
+class ResultsStore:
+    """
+    Dict-like view over the `results` table, keyed by file hash.
+    Reads go through a small in-process LRU of hits; writes invalidate it, and so
+    do commits from other processes (add_result.py), detected via PRAGMA data_version.
+    Calls block on SQLite, so async callers should run them in a thread.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, cache_size: int = 256):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")  # concurrent readers while writing
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                hash TEXT PRIMARY KEY,
+                filename TEXT,
+                doc_type TEXT,
+                payload_json TEXT NOT NULL,
+                completed_at TEXT,
+                run_dir TEXT
+            )
+            """
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._data_version = self._current_data_version()
+
+    def _current_data_version(self) -> int:
+        # Changes whenever another connection commits; our own commits leave it alone
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def get(self, file_hash: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data_version = self._current_data_version()
+            if data_version != self._data_version:
+                self._cache.clear()  # another process wrote; cached payloads may be stale
+                self._data_version = data_version
+            if file_hash in self._cache:
+                self._cache.move_to_end(file_hash)
+                return self._cache[file_hash]
+            row = self._db.execute(
+                "SELECT payload_json FROM results WHERE hash = ?", (file_hash,)
+            ).fetchone()
+            if row is None:
+                # Misses aren't cached: another process may add the result later
+                return default
+            payload = orjson.loads(row[0])
+            self._cache[file_hash] = payload
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return payload
+
+    def put(self, file_hash: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            # Upsert rather than INSERT OR REPLACE: REPLACE deletes the row and
+            # inserts a new rowid, which would move a rewritten result to the end
+            # of the history (values() orders by rowid)
+            self._db.execute(
+                "INSERT INTO results (hash, filename, doc_type, payload_json, completed_at, run_dir) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET filename = excluded.filename, doc_type = excluded.doc_type, "
+                "payload_json = excluded.payload_json, completed_at = excluded.completed_at, "
+                "run_dir = excluded.run_dir",
+                (
+                    file_hash,
+                    payload.get("filename"),
+                    payload.get("doc_type"),
+                    orjson.dumps(payload).decode(),
+                    payload.get("completedAt"),
+                    payload.get("run_dir"),
+                ),
+            )
+            self._db.commit()
+            self._cache.pop(file_hash, None)
+
+    def values(self, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """All results in insertion order, or only the first `limit` of them"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT payload_json FROM results ORDER BY rowid LIMIT ?",
+                (-1 if limit is None else max(limit, 0),),  # -1 = no limit in SQLite
+            ).fetchall()
+        return (orjson.loads(row[0]) for row in rows)
+
+    def __contains__(self, file_hash: str) -> bool:
+        return self.get(file_hash) is not None
+
+    def __getitem__(self, file_hash: str) -> Dict[str, Any]:
+        payload = self.get(file_hash)
+        if payload is None:
+            raise KeyError(file_hash)
+        return payload
+
+    def __setitem__(self, file_hash: str, payload: Dict[str, Any]) -> None:
+        self.put(file_hash, payload)
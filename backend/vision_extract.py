@@ -5,14 +5,20 @@ Vision-based extraction using Gemini 2.5 Pro Vision to convert PDF pages to mark
 import argparse
 import os
 from pathlib import Path
-import json
-import base64
 from dotenv import load_dotenv
 import google.generativeai as genai
 import fitz  # PyMuPDF for PDF page extraction
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import _generate_with_retry
 
 load_dotenv()
 
+# Max number of Gemini Vision requests in flight at once (--per-page)
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "8"))
+# Page image format: "png" (lossless) or "jpeg" (smaller for scanned/photo-heavy pages)
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "png").lower()
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+
 def setup_gemini():
     """Setup Gemini Vision API"""
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("LANGEXTRACT_API_KEY")
@@ -36,17 +42,39 @@ def extract_pdf_pages_as_images(pdf_path: str, start_page: int = 6, end_page: in
             page = doc.load_page(page_num)
             # Render page as image with higher resolution
             pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))  # 2x zoom for better quality
-            img_data = pix.tobytes("png")
+            if VISION_IMAGE_FORMAT == "jpeg":
+                img_data, mime_type = pix.tobytes("jpeg", jpg_quality=VISION_JPEG_QUALITY), "image/jpeg"
+            else:
+                img_data, mime_type = pix.tobytes("png"), "image/png"
             images.append({
                 "page": page_num + 1,  # Convert to 1-indexed for display
-                "image_data": img_data
+                "image_data": img_data,
+                "mime_type": mime_type,
             })
     
     doc.close()
     return images
 
-def convert_pages_to_markdown(model, images: list) -> str:
-    """Use Gemini Vision to convert PDF pages to structured markdown"""
+def _generate_markdown(model, prompt: str, images: list) -> str:
+    """One Gemini Vision request: the prompt followed by the given page images"""
+    content_parts = [prompt]
+    for img in images:
+        # Raw bytes - the SDK handles the wire encoding
+        content_parts.append({
+            "mime_type": img.get("mime_type", "image/png"),
+            "data": img["image_data"]
+        })
+    # Same backoff on 429/5xx (and GEMINI_RPS cap) as the pipeline's Vision calls
+    response = _generate_with_retry(model, content_parts)
+    return response.text
+
+def convert_pages_to_markdown(model, images: list, per_page: bool = False) -> str:
+    """
+    Use Gemini Vision to convert PDF pages to structured markdown.
+    per_page sends one request per page, concurrently, and joins the results in
+    page order - faster for long ranges, but a page that continues a table no
+    longer sees the section headings on the page before it.
+    """
     
     prompt = """
 You are a financial data extraction expert. I have PDF pages showing a "Schedule of Investments" or "Condensed Schedule of Investments" section from a financial statement.
@@ -77,17 +105,12 @@ Please convert the provided PDF pages to markdown:
 """
     
     try:
-        # Prepare the content parts
-        content_parts = [prompt]
-        
-        for img in images:
-            content_parts.append({
-                "mime_type": "image/png",
-                "data": base64.b64encode(img["image_data"]).decode('utf-8')
-            })
-        
-        response = model.generate_content(content_parts)
-        return response.text
+        if not per_page or len(images) < 2:
+            return _generate_markdown(model, prompt, images)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(VISION_CONCURRENCY, len(images)))) as ex:
+            parts = list(ex.map(lambda img: _generate_markdown(model, prompt, [img]), images))
+        return "\n\n".join(part for part in parts if part)
     except Exception as e:
         print(f"Error calling Gemini Vision API: {e}")
         return None
@@ -98,6 +121,8 @@ def main():
     ap.add_argument("--start-page", type=int, default=6, help="Start page (0-indexed, default 6 for page 7)")
     ap.add_argument("--end-page", type=int, default=7, help="End page (0-indexed, default 7 for page 8)")
     ap.add_argument("--output", default="vision_markdown.md", help="Output markdown file")
+    ap.add_argument("--per-page", action="store_true",
+                    help="One concurrent Vision request per page instead of a single request for all pages")
     args = ap.parse_args()
 
     print(f"Processing PDF: {args.pdf}")
@@ -113,7 +138,7 @@ def main():
     
     # Convert to markdown using Gemini Vision
     print("Converting to markdown using Gemini Vision...")
-    markdown_content = convert_pages_to_markdown(model, images)
+    markdown_content = convert_pages_to_markdown(model, images, per_page=args.per_page)
     
     if not markdown_content:
         print("Failed to convert pages to markdown")